@@ -99,6 +99,55 @@ fun! pymode#reload_buf_by_nr(nr) "{{{
     exe "buffer " . cur
 endfunction "}}}
 
+fun! pymode#outline() "{{{
+    " DESC: Return class and def statements of the current buffer (computed
+    " once per change): a list of dictionaries with keys kind ('class' or
+    " 'def'), name, first (line of the first decorator), line, body (first
+    " line of the body), end and parent (index of the enclosing definition or
+    " -1), sorted by lines.
+    "
+    if g:pymode_python == 'disable'
+        return []
+    endif
+    let outline = get(b:, 'pymode_outline', {})
+    if get(outline, 'changedtick', -1) != b:changedtick
+        let l:entries = []
+        PymodePython from pymode.outline import get_outline
+        PymodePython get_outline()
+        let b:pymode_outline = {'changedtick': b:changedtick,
+                              \ 'entries': l:entries, 'targets': {}}
+    endif
+    return b:pymode_outline.entries
+endfunction "}}}
+
+fun! pymode#common_lines(old, new) "{{{
+    " DESC: Compare lines of a buffer with their previous version.
+    " Return [first, last]: numbers of equal lines at the start and at the end
+    " (not overlapping).
+    "
+    let [lo, hi] = [0, min([len(a:old), len(a:new)])]
+    while lo < hi
+        let mid = (lo + hi + 1) / 2
+        if a:old[: mid - 1] ==# a:new[: mid - 1]
+            let lo = mid
+        else
+            let hi = mid - 1
+        endif
+    endwhile
+    let first = lo
+
+    let [lo, hi] = [0, min([len(a:old), len(a:new)]) - first]
+    while lo < hi
+        let mid = (lo + hi + 1) / 2
+        if a:old[-mid :] ==# a:new[-mid :]
+            let lo = mid
+        else
+            let hi = mid - 1
+        endif
+    endwhile
+    return [first, lo]
+endfunction "}}}
+
 fun! pymode#buffer_pre_write() "{{{
     let b:pymode_modified = &modified
 endfunction "}}}
@@ -109,6 +158,10 @@ fun! pymode#buffer_post_write() "{{{
             call pymode#debug('regenerate')
             call pymode#rope#regenerate()
         endif
+        if g:pymode_rope_symbols && b:pymode_modified
+            call pymode#rope#update_symbols()
+        endif
+        call pymode#rope#sync(1)
     endif
     if g:pymode_lint
         if g:pymode_lint_unmodified || (g:pymode_lint_on_write && b:pymode_modified)
@@ -0,0 +1,73 @@
+" Python-mode docstrings: state of triple quotes after every line of a buffer.
+
+let s:docstring_begin_regex = '^\s*[uUrR]\=\%("""\|''''''\).*\S'
+let s:docstring_end_regex = '\%("""\|''''''\)\s*$'
+let s:docstring_general_regex = '\%("""\|''''''\)'
+" ''''''''
+
+
+fun! pymode#docstring#states() "{{{
+    " DESC: Return states of docstrings after the current buffer lines (a list
+    " of numbers, odd inside of a docstring).
+    "
+    " The table (b:pymode_docstrings) is updated once per change: lines are
+    " scanned again from the first changed line until the state is the same
+    " as before the change.
+    "
+    let table = get(b:, 'pymode_docstrings', {})
+    if get(table, 'changedtick', -1) == b:changedtick
+        return table.states
+    endif
+
+    let lines = getline(1, '$')
+    if empty(table)
+        let states = s:Scan(lines, 0, [], 0, 0)
+    else
+        let [first, last] = pymode#common_lines(table.lines, lines)
+        let states = s:Scan(lines, first, table.states,
+                          \ len(lines) - last, len(lines) - len(table.lines))
+    endif
+    let b:pymode_docstrings = {'changedtick': b:changedtick, 'lines': lines,
+                             \ 'states': states}
+    return states
+endfunction "}}}
+
+
+fun! pymode#docstring#opening(lnum) "{{{
+    " DESC: Check the line is inside of a docstring (or opens it).
+    "
+    return get(pymode#docstring#states(), a:lnum - 1, 0) % 2
+endfunction "}}}
+
+
+fun! s:Scan(lines, from, old, last, delta) "{{{
+    " Scan lines after a:from. Lines after a:last are the lines of a:old
+    " shifted by a:delta.
+    "
+    " A state counts triple quotes which are not docstrings (they are skipped
+    " before a docstring may start again): 2 * extra + open.
+    let states = a:from ? a:old[: a:from - 1] : []
+    let state = a:from ? states[-1] : 0
+    let i = a:from
+    for line in a:lines[a:from :]
+        let i += 1
+        if line =~ s:docstring_general_regex
+            if line =~ s:docstring_begin_regex && !(state % 2)
+                " Skip triple quotes which are not docstrings
+                let state = state > 1 ? state - 2 : 1
+            elseif line =~ s:docstring_end_regex && state % 2
+                let state -= 1
+            else
+                let state += 2
+            endif
+        endif
+        call add(states, state)
+
+        if i > a:last && i - a:delta > 0 && get(a:old, i - a:delta - 1, -1) == state
+            return extend(states, a:old[i - a:delta :])
+        endif
+    endfor
+    return states
+endfunction "}}}
+
+" vim: fdm=marker:fdl=0
@@ -10,8 +10,8 @@ let s:decorator_regex = '^\s*@\(author:\)\@!'
 let s:docstring_line_regex = '^\s*[uUrR]\=\("""\|''''''\).\+\1\s*$'
 let s:docstring_begin_regex = '^\s*[uUrR]\=\%("""\|''''''\).*\S'
 let s:docstring_end_regex = '\%("""\|''''''\)\s*$'
-" This one is needed for the while loop to count for opening and closing
-" docstrings.
+" Lines with any triple quotes (opening and closing docstrings are counted by
+" pymode#docstring#states).
 let s:docstring_general_regex = '\%("""\|''''''\)'
 let s:symbol = matchstr(&fillchars, 'fold:\zs.')  " handles multibyte characters
 if s:symbol == ''
@@ -46,7 +46,7 @@ endfunction "}}}
 
 fun! pymode#folding#expr(lnum) "{{{
 
-    let l:return_value = pymode#folding#foldcase(a:lnum)['foldlevel']
+    let l:return_value = get(s:Levels().levels, a:lnum - 1, 0)
 
     return l:return_value
 
@@ -56,154 +56,264 @@ fun! pymode#folding#foldcase(lnum) "{{{
     " Return a dictionary with a brief description of the foldcase and the
     " evaluated foldlevel: {'foldcase': 'case description', 'foldlevel': 1}.
 
-    let l:foldcase = 'general'
-    let l:foldlevel = 0
+    let fold = s:Levels()
+    return {'foldcase': get(fold.cases, a:lnum - 1, 'general'),
+          \ 'foldlevel': get(fold.levels, a:lnum - 1, 0)}
 
-    let line = getline(a:lnum)
-    let indent = indent(a:lnum)
-    let prev_line = getline(a:lnum - 1)
-    let next_line = getline(a:lnum + 1)
-
-    " Decorators {{{
-    if line =~ s:decorator_regex
-        let l:foldcase = 'decorator declaration'
-        let l:foldlevel = '>'.(indent / &shiftwidth + 1)
-        return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-    endif "}}}
-
-    " Definition {{{
-    if line =~ s:def_regex
-
-        " TODO: obscure case.
-        " If indent of this line is greater or equal than line below
-        " and previous non blank line does not end with : (that is, is not a
-        " definition)
-        " Keep the same indentation
-        " xxx " if indent(a:lnum) >= indent(a:lnum+1)
-        " xxx "         \ && getline(prevnonblank(a:lnum)) !~ ':\s*$'
-        " xxx "     let l:foldcase = 'definition'
-        " xxx "     let l:foldlevel = '='
-        " xxx "     return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-        " xxx " endif
-
-        " Check if last decorator is before the last def
-        let decorated = 0
-        let lnum = a:lnum - 1
-        while lnum > 0
-            if getline(lnum) =~ s:def_regex
-                break
-            elseif getline(lnum) =~ s:decorator_regex
-                let decorated = 1
+endfunction "}}}
+
+fun! s:Levels() "{{{
+    " Get fold levels of the current buffer (b:pymode_folding), they are
+    " computed once per change.
+    "
+    " After changes the lines are swept again from the last top level
+    " definition before the first changed line, and only until a top level
+    " definition after the changed lines is reached in the same state as
+    " before.
+
+    let fold = get(b:, 'pymode_folding', {})
+    if get(fold, 'changedtick', -1) == b:changedtick
+        return fold
+    endif
+
+    let lines = getline(1, '$')
+    let from = 0
+    let old = {}
+    if get(fold, 'shiftwidth', -1) == &shiftwidth
+            \ && get(fold, 'tabstop', -1) == &tabstop
+        let [same, last] = pymode#common_lines(fold.lines, lines)
+        if same == len(lines) && same == len(fold.lines)
+            let fold.changedtick = b:changedtick
+            return fold
+        endif
+
+        " Top level definitions before the change
+        let anchors = filter(copy(fold.anchors), 'v:key <= same')
+        let from = max(map(keys(anchors), 'str2nr(v:val)'))
+        " The definition at line 1 may end after the change
+        if !empty(fold.first) && (!fold.first[2] || fold.first[2] > same)
+            let from = 0
+        endif
+
+        if from
+            let old = {
+                \ 'levels': fold.levels, 'cases': fold.cases,
+                \ 'anchors': fold.anchors,
+                \ 'delta': len(lines) - len(fold.lines),
+                \ 'last': len(lines) - last}
+            let fold.levels = fold.levels[: from - 1]
+            let fold.cases = fold.cases[: from - 1]
+            let fold.anchors = anchors
+        endif
+    endif
+
+    if !from
+        let fold = {'levels': [], 'cases': [], 'anchors': {}, 'first': [],
+                  \ 'predef': []}
+    endif
+    let fold.changedtick = b:changedtick
+    let fold.shiftwidth = &shiftwidth
+    let fold.tabstop = &tabstop
+    let fold.lines = lines
+    call s:Sweep(fold, from, old)
+    let b:pymode_folding = fold
+    return fold
+
+endfunction "}}}
+
+fun! s:Sweep(fold, from, old) "{{{
+    " Compute fold levels of the lines after a:from (a top level definition or
+    " 0) in a single pass.
+    "
+    " The state of the pass replaces backward searches: open definitions (def
+    " and class lines with lower indent than the lines below them, with the
+    " next line at their indent) and blank lines waiting for the end of their
+    " block.
+
+    let fold = a:fold
+    let sw = &shiftwidth
+    let docstrings = pymode#docstring#states()
+    if a:from
+        let prev_bs = fold.anchors[a:from][1]
+        let classes = [[a:from, 0]]
+        let defs = [[a:from, 0, 0, copy(classes)]]
+        let anydef = 1
+        let prevnonblank = a:from
+        let prev_indent = 0
+    else
+        let prev_bs = 0
+        let classes = []
+        let defs = []
+        let anydef = 0
+        let prevnonblank = 0
+        let prev_indent = -1
+    endif
+    let decorated = 0
+    let prev_blank = !a:from
+    let blanks = []
+
+    let i = a:from
+    for line in fold.lines[a:from :]
+        let i += 1
+        let blank = line =~ s:blank_regex
+        let lead = matchend(line, '^\s*')
+        let indent = blank ? 0 : indent(i)
+
+        let quoted = line =~ s:docstring_general_regex
+
+        " Statements at the indent of open definitions end them.
+        if !blank && line[lead] != '#'
+            for def in defs
+                if !def[2] && def[1] == lead
+                    let def[2] = i
+                endif
+            endfor
+            if !empty(fold.first) && !fold.first[2] && fold.first[1] == lead
+                let fold.first[2] = i
+            endif
+        endif
+        " A line at column 1 ends blocks of the blank lines before it.
+        if !blank && !lead
+            for blank_lnum in blanks
+                let [fold.cases[blank_lnum - 1], fold.levels[blank_lnum - 1]]
+                    \ = blank_lnum < i - 1
+                    \ && blank_lnum > fold.levels[blank_lnum - 1]
+                    \ ? ['blank line inside block', '=']
+                    \ : ['general', 0]
+            endfor
+            let blanks = []
+        endif
+
+        " Block start: the definition which encloses the line.
+        let inferred = blank ? prevnonblank : indent
+        let def = []
+        let k = len(defs) - 1
+        while k >= 0
+            if defs[k][1] < inferred
+                let def = defs[k]
                 break
             endif
-            let lnum -= 1
+            let k -= 1
         endwhile
-        if decorated
-            let l:foldcase = 'decorated function declaration'
-            let l:foldlevel = '='
+        if empty(def) && !empty(fold.first)
+            let def = fold.first
+        endif
+        if !empty(def)
+            if def[2] && def[2] < i
+                let max_indent = max([indent(def[2]) - sw, 0])
+            else
+                let max_indent = max([(blank ? prev_indent : indent) - sw, 0])
+            endif
+            let bs = s:LastClass(def[3], max_indent)
+        elseif anydef
+            let bs = s:LastClass(fold.predef, 0)
         else
-            let l:foldcase = 'function declaration'
-            let l:foldlevel = '>'.(indent / &shiftwidth + 1)
+            let bs = line =~ '^\%(def \|class \)\w' ? i : 0
         endif
-        return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-    endif "}}}
-
-    " Docstrings {{{
 
-    " TODO: A while loop now counts the number of open and closed folding in
-    " order to determine if it is a closing or opening folding.
-    " It is working but looks like it is an overkill.
+        let is_decorator = line =~ s:decorator_regex
+        let is_def = line =~ s:def_regex
+        if is_decorator
+            let case = ['decorator declaration', '>'.(indent / sw + 1)]
+        elseif is_def
+            let case = decorated
+                \ ? ['decorated function declaration', '=']
+                \ : ['function declaration', '>'.(indent / sw + 1)]
+        elseif quoted && line =~ s:docstring_line_regex
+            let case = ['one-liner docstring', '=']
+        elseif quoted && line =~ s:docstring_begin_regex
+            let case = docstrings[i - 1] % 2
+                \ ? ['open multiline docstring', 'a1'] : ['general', 0]
+        elseif quoted && line =~ s:docstring_end_regex
+            let case = !(docstrings[i - 1] % 2)
+                \ ? ['close multiline docstring', 's1'] : ['general', 0]
+        elseif !blank
+            if bs == prev_bs || i - bs == 1
+                let case = ['non blank line; first line of block or part of it', '=']
+            elseif indent < prev_indent
+                let case = indent == 0
+                    \ ? ['non blank line; zero indent', 0]
+                    \ : ['non blank line; non zero indent', indent(bs) / sw + 1]
+            else
+                let case = ['general', 0]
+            endif
+        elseif !prev_blank
+            let case = ['blank line after non blank line', '=']
+        else
+            " Keep the block start until the block end is found
+            let case = ['general', bs]
+            call add(blanks, i)
+        endif
+        call add(fold.cases, case[0])
+        call add(fold.levels, case[1])
 
-    " Notice that an effect of this is that other docstring matches will not
-    " be one liners.
-    if line =~ s:docstring_line_regex
-        let l:foldcase = 'one-liner docstring'
-        let l:foldlevel = '='
-        return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-    endif
-    if line =~ s:docstring_begin_regex
-        if s:Is_opening_folding(a:lnum)
-            let l:foldcase = 'open multiline docstring'
-            let l:foldlevel = 'a1'
+        " Class and def statements (searched by the block start).
+        if is_def && !anydef
+            let fold.predef = copy(classes)
+            let anydef = 1
         endif
-        return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-    endif
-    if line =~ s:docstring_end_regex
-        if !s:Is_opening_folding(a:lnum)
-            let l:foldcase = 'close multiline docstring'
-            let l:foldlevel = 's1'
+        if line =~ '^\s*\%(def \|class \)\w'
+            while !empty(classes) && classes[-1][1] >= lead
+                call remove(classes, -1)
+            endwhile
+            call add(classes, [i, lead])
         endif
-        return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-    endif "}}}
-
-    " Blocks. {{{
-    let s:save_cursor = getcurpos()
-    let line_block_start = s:BlockStart(a:lnum)
-    let line_block_end = s:BlockEnd(a:lnum)
-    let prev_line_block_start = s:BlockStart(a:lnum - 1)
-    if line !~ s:blank_regex
-        if line_block_start == prev_line_block_start
-                \ || a:lnum  - line_block_start == 1
-            let l:foldcase = 'non blank line; first line of block or part of it'
-            let l:foldlevel = '='
-        elseif indent < indent(prevnonblank(a:lnum - 1))
-            if indent == 0
-                let l:foldcase = 'non blank line; zero indent'
-                let l:foldlevel = 0
-            else
-                let l:foldcase = 'non blank line; non zero indent'
-                let l:foldlevel = indent(line_block_start) / &shiftwidth + 1
+        if is_def
+            while !empty(defs) && defs[-1][1] >= indent
+                call remove(defs, -1)
+            endwhile
+            call add(defs, [i, indent, 0, copy(classes)])
+            if i == 1
+                let fold.first = defs[-1]
             endif
+            let decorated = 0
+        elseif is_decorator
+            let decorated = 1
         endif
-        call setpos('.', s:save_cursor)
-        return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-    else
-        call setpos('.', s:save_cursor)
-    endif
-    " endif " }}}
-
-    " Blank Line {{{
-    " Comments: cases of blank lines:
-    " 1. After non blank line: gets folded with previous line.
-    " 1. Just after a block; in this case it gets folded with the block.
-    " 1. Between docstrings and imports.
-    " 1. Inside docstrings.
-    " 2. Inside functions/methods.
-    " 3. Between functions/methods.
-    if line =~ s:blank_regex
-        if prev_line !~ s:blank_regex
-            let l:foldcase = 'blank line after non blank line'
-            let l:foldlevel = '='
-            return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-        elseif a:lnum > line_block_start && a:lnum < line_block_end
-            let l:foldcase = 'blank line inside block'
-            let l:foldlevel = '='
-            return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
+
+        if !blank
+            let prevnonblank = i
+            let prev_indent = indent
+        endif
+        let prev_blank = blank
+        let prev_bs = bs
+
+        " A top level definition: the state is known from its line, the rest
+        " is the same as before the change.
+        if is_def && !indent && !lead && len(classes) == 1
+                \ && classes[0][0] == i
+            let fold.anchors[i] = [docstrings[i - 1], bs]
+            if !empty(a:old) && i > a:old.last
+                let lnum = i - a:old.delta
+                if get(a:old.anchors, lnum, []) == fold.anchors[i]
+                    call extend(fold.levels, a:old.levels[lnum :])
+                    call extend(fold.cases, a:old.cases[lnum :])
+                    for [lnum, anchor] in items(a:old.anchors)
+                        if lnum > i - a:old.delta
+                            let fold.anchors[lnum + a:old.delta] = anchor
+                        endif
+                    endfor
+                    return
+                endif
+            endif
         endif
-        " if prev_line =~ s:blank_regex
-        "     if indent(a:lnum + 1) == 0 && next_line !~ s:blank_regex && next_line !~ s:docstring_general_regex
-        "         if s:Is_opening_folding(a:lnum)
-        "             let l:foldcase = 'case 1'
-        "             let l:foldlevel = '='
-        "             return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-        "         else
-        "             let l:foldcase = 'case 2'
-        "             let l:foldlevel = 0
-        "             return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-        "         endif
-        "     endif
-        "     let l:foldcase = 'case 3'
-        "     let l:foldlevel = -1
-        "     return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-        " else
-        "     let l:foldcase = 'case 4'
-        "     let l:foldlevel = '='
-        "     return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
-        " endif
-    endif " }}}
-
-    return {'foldcase': l:foldcase, 'foldlevel': l:foldlevel}
+    endfor
 
+    " Blank lines at the end of file are not in a block
+    for blank_lnum in blanks
+        let fold.levels[blank_lnum - 1] = 0
+    endfor
+
+endfunction "}}}
+
+fun! s:LastClass(classes, max_indent) "{{{
+    " Return the last class or def line with indent up to a:max_indent.
+    for [lnum, lead] in reverse(copy(a:classes))
+        if lead <= a:max_indent
+            return lnum
+        endif
+    endfor
+    return 0
 endfunction "}}}
 
 fun! s:BlockStart(lnum) "{{{
@@ -273,56 +383,5 @@ function! Blockend(lnum)
     call setpos('.', save_cursor)
 endfunction
 
-function! s:Is_opening_folding(lnum) "{{{
-    " Helper function to see if multi line docstring is opening or closing.
-
-    " Cache the result so the loop runs only once per change.
-    if get(b:, 'fold_changenr', -1) == changenr()
-        return b:fold_cache[a:lnum - 1]  "If odd then it is an opening
-    else
-        let b:fold_changenr = changenr()
-        let b:fold_cache = []
-    endif
-
-    " To be analized if odd/even to inform if it is opening or closing.
-    let fold_odd_even = 0
-    " To inform is already has an open docstring.
-    let has_open_docstring = 0
-    " To help skipping ''' and """ which are not docstrings.
-    let extra_docstrings = 0
-
-    " The idea of this part of the function is to identify real docstrings and
-    " not just triple quotes (that could be a regular string).
-
-    " Iterater over all lines from the start until current line (inclusive)
-    for i in range(1, line('$'))
-
-        let i_line = getline(i)
-
-        if i_line =~ s:docstring_begin_regex && ! has_open_docstring
-            " This causes the loop to continue if there is a triple quote which
-            " is not a docstring.
-            if extra_docstrings > 0
-                let extra_docstrings = extra_docstrings - 1
-            else
-                let has_open_docstring = 1
-                let fold_odd_even = fold_odd_even + 1
-            endif
-        " If it is an end doc and has an open docstring.
-        elseif i_line =~ s:docstring_end_regex && has_open_docstring
-            let has_open_docstring = 0
-            let fold_odd_even = fold_odd_even + 1
-
-        elseif i_line =~ s:docstring_general_regex
-            let extra_docstrings = extra_docstrings + 1
-        endif
-
-        call add(b:fold_cache, fold_odd_even % 2)
-
-    endfor
-
-    return b:fold_cache[a:lnum]
-
-endfunction "}}}
 
 " vim: fdm=marker:fdl=0
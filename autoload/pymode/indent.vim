@@ -6,8 +6,23 @@
 " Last Change:      2012-06-21
 " License:          Public Domain
 
+" Lines scanned by python tokenizer after a requested line
+let s:brackets_ahead = 200
+
 
 function! pymode#indent#get_indent(lnum)
+    let indent = s:Indent(a:lnum)
+    if exists('b:pymode_brackets')
+        " Remember the line to keep brackets when its indent is set
+        let b:pymode_brackets.last = indent >= 0 && indent != indent(a:lnum) ?
+                    \ [a:lnum, substitute(getline(a:lnum), '^\s*', '', ''), indent] :
+                    \ [0, '', -1]
+    endif
+    return indent
+endfunction
+
+
+function! s:Indent(lnum)
 
     " First line has indent 0
     if a:lnum == 1
@@ -15,10 +30,8 @@ function! pymode#indent#get_indent(lnum)
     endif
 
     " If we can find an open parenthesis/bracket/brace, line up with it.
-    call cursor(a:lnum, 1)
-    let parlnum = s:SearchParensPair()
+    let [parlnum, parcol] = s:OpenBracket(a:lnum)
     if parlnum > 0
-        let parcol = col('.')
         let closing_paren = match(getline(a:lnum), '^\s*[])}]') != -1
         if match(getline(parlnum), '[([{]\s*$', parcol - 1) != -1
             if closing_paren
@@ -104,6 +117,72 @@ function! pymode#indent#get_indent(lnum)
 endfunction
 
 
+" Find the closest parenthesis/bracket/brace opened before the line.
+function! s:OpenBracket(lnum) " {{{
+    let brackets = s:Brackets(a:lnum)
+    if a:lnum <= len(brackets.table)
+        let [parlnum, parcol] = brackets.table[a:lnum - 1]
+        if parlnum > 0
+            return [parlnum, len(matchstr(getline(parlnum), '^\s*')) + parcol]
+        endif
+        return [0, 0]
+    endif
+
+    " Without python or after a tokenizer error
+    call cursor(a:lnum, 1)
+    let parlnum = s:SearchParensPair()
+    return [parlnum, col('.')]
+endfunction " }}}
+
+
+" Open brackets at the starts of lines found by python tokenizer. After a
+" change the lines above the change keep their brackets; setting the indent
+" returned for a line (by = for example) keeps all of them.
+function! s:Brackets(lnum) " {{{
+    if g:pymode_python == 'disable'
+        return {'table': []}
+    endif
+
+    let cache = get(b:, 'pymode_brackets', {})
+    if empty(cache)
+        let cache = {'changedtick': b:changedtick, 'lines': getline(1, '$'),
+                    \ 'table': [], 'scanned': 0, 'last': [0, '', -1]}
+    elseif cache.changedtick != b:changedtick
+        let [lnum, text, indent] = cache.last
+        if b:changedtick == cache.changedtick + 1 && lnum > 0 &&
+                    \ line('$') == len(cache.lines) && indent(lnum) == indent &&
+                    \ substitute(getline(lnum), '^\s*', '', '') ==# text
+            let cache.lines[lnum - 1] = getline(lnum)
+        else
+            let lines = getline(1, '$')
+            let first = pymode#common_lines(cache.lines, lines)[0]
+            let cache.table = cache.table[: first]
+            let cache.scanned = len(cache.table)
+            let cache.lines = lines
+        endif
+        let cache.changedtick = b:changedtick
+        let cache.last = [0, '', -1]
+    endif
+    let b:pymode_brackets = cache
+
+    if a:lnum > cache.scanned
+        " Scan from the last line out of brackets and strings
+        let start = len(cache.table)
+        while start > 1 && cache.table[start - 1] != [0, 0]
+            let start -= 1
+        endwhile
+        let start = max([start, 1])
+        let stop = min([a:lnum + s:brackets_ahead, line('$')])
+        let l:brackets = []
+        PymodePython from pymode.indent import get_brackets
+        PymodePython get_brackets()
+        let cache.table = (start > 1 ? cache.table[: start - 2] : []) + l:brackets
+        let cache.scanned = max([stop, len(cache.table)])
+    endif
+    return cache
+endfunction " }}}
+
+
 " Find backwards the closest open parenthesis/bracket/brace.
 function! s:SearchParensPair() " {{{
     let line = line('.')
@@ -154,8 +233,7 @@ function! s:StatementStart(lnum) " {{{
         if getline(lnum - 1) =~ '\\$'
             let lnum = lnum - 1
         else
-            call cursor(lnum, 1)
-            let maybe_lnum = s:SearchParensPair()
+            let maybe_lnum = s:OpenBracket(lnum)[0]
             if maybe_lnum < 1
                 return lnum
             else
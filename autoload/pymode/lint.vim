@@ -1,7 +1,15 @@
-PymodePython from pymode.lint import code_check
+PymodePython from pymode.lint import code_check, code_check_request, code_check_region
+PymodePython from pymode.lint import code_check_project, code_check_project_request
+PymodePython from pymode import lint
 
 call pymode#tools#signs#init()
 call pymode#tools#loclist#init()
+call pymode#tools#job#init()
+
+let s:worker_script = expand('<sfile>:p:h:h:h') . '/pymode/lint_worker.py'
+call pymode#default('g:pymode_lint_request_id', 0)
+call pymode#default('g:pymode_lint_queue', {})
+let s:project = {'id': 0, 'files': 0}
 
 
 fun! pymode#lint#auto() "{{{
@@ -49,6 +57,10 @@ endfunction "}}}
 fun! pymode#lint#check() "{{{
     " DESC: Run checkers on current file.
     "
+    if g:pymode_lint_async && pymode#lint#start()
+        return pymode#lint#check_async()
+    endif
+
     let loclist = g:PymodeLocList.current()
 
     let b:pymode_error_line = -1
@@ -59,46 +71,224 @@ fun! pymode#lint#check() "{{{
 
     PymodePython code_check()
 
-    if loclist.is_empty()
+    call s:ShowResults(loclist)
+
+endfunction " }}}
+
+
+fun! pymode#lint#check_region() "{{{
+    " DESC: Check only the part of current file changed since the last check.
+    "
+    let l:full = 0
+
+    PymodePython code_check_region()
+
+    if l:full
+        return pymode#lint#check()
+    endif
+
+    let loclist = g:PymodeLocList.current()
+    let b:pymode_error_line = -1
+    call s:ShowResults(loclist)
+
+endfunction " }}}
+
+
+fun! pymode#lint#check_async() "{{{
+    " DESC: Send current file to the background checker.
+    "
+    let l:request = ''
+
+    PymodePython code_check_request()
+
+    if empty(l:request)
+        return
+    endif
+
+    " Results of a previous version of the buffer are useless now.
+    silent! call remove(g:pymode_lint_queue, bufnr('%'))
+
+    call g:pymode_lint_worker.send(l:request)
+    call pymode#wide_message('Code checking is running in background ...')
+
+endfunction " }}}
+
+
+fun! pymode#lint#project() "{{{
+    " DESC: Check all python files of the project into the quickfix list.
+    "
+    call setqflist([])
+    let s:project = {'id': 0, 'files': 0}
+
+    if g:pymode_lint_async && pymode#lint#start()
+        let l:request = ''
+        PymodePython code_check_project_request()
+        let s:project.id = g:pymode_lint_request_id
+        call g:pymode_lint_worker.send(l:request)
+        return pymode#wide_message('Project checking is running in background ...')
+    endif
+
+    call pymode#wide_message('Project checking is running ...')
+    PymodePython code_check_project()
+    call s:ProjectDone()
+endfunction "}}}
+
+
+fun! pymode#lint#project_add(path, errors) "{{{
+    " DESC: Add errors of a checked project file to the quickfix list.
+    "
+    let s:project.files += 1
+    if !empty(a:errors)
+        call setqflist(a:errors, 'a')
+    endif
+    call pymode#wide_message(printf('Project checking: %d file(s), %d issue(s) ...',
+                \ s:project.files, len(getqflist())))
+    redraw
+endfunction "}}}
+
+
+fun! s:ProjectDone() "{{{
+    call pymode#quickfix_open(0, g:pymode_quickfix_maxheight, g:pymode_quickfix_minheight, 0)
+    call pymode#wide_message(printf('Project checking is completed: %d file(s), %d issue(s).',
+                \ s:project.files, len(getqflist())))
+endfunction "}}}
+
+
+fun! s:OnProject(result) "{{{
+    " Results of a restarted project check are useless.
+    if a:result.id != s:project.id
+        return
+    endif
+    if has_key(a:result, 'error')
+        return pymode#error(a:result.error)
+    endif
+    if get(a:result, 'done', 0)
+        return s:ProjectDone()
+    endif
+    call pymode#lint#project_add(a:result.path, a:result.errors)
+endfunction "}}}
+
+
+fun! s:ShowResults(loclist) "{{{
+    if a:loclist.is_empty()
         call pymode#wide_message('Code checking is completed. No errors found.')
-        call g:PymodeSigns.refresh(loclist)
-        call loclist.show()
+        call g:PymodeSigns.refresh(a:loclist)
+        call a:loclist.show()
         return
     endif
 
-    call g:PymodeSigns.refresh(loclist)
+    call g:PymodeSigns.refresh(a:loclist)
 
-    call loclist.show()
+    call a:loclist.show()
 
     call pymode#lint#show_errormessage()
-    call pymode#wide_message('Found ' . loclist.num_errors() . ' error(s) and ' . loclist.num_warnings() . ' warning(s)')
+    call pymode#wide_message('Found ' . a:loclist.num_errors() . ' error(s) and ' . a:loclist.num_warnings() . ' warning(s)')
+endfunction "}}}
 
-endfunction " }}}
+
+fun! s:OnResult(msg) "{{{
+    " DESC: Receive a response from the background checker.
+    "
+    try
+        let result = json_decode(a:msg)
+    catch
+        return pymode#debug('lint worker: ' . a:msg)
+    endtry
+
+    if get(result, 'method', '') == 'project'
+        return s:OnProject(result)
+    endif
+
+    " The worker couldn't read a request
+    if has_key(result, 'error') && type(get(result, 'bufnr')) != type(0)
+        return pymode#error(result.error)
+    endif
+
+    " Drop stale results: a newer version of the buffer is already in flight.
+    if type(get(result, 'bufnr')) != type(0)
+                \ || getbufvar(result.bufnr, 'pymode_lint_request', -1) != result.id
+        return
+    endif
+
+    if has_key(result, 'cache')
+        call pymode#debug('lint cache: ' . string(result.cache))
+    endif
+    if has_key(result, 'timings')
+        call pymode#debug('checkers time: ' . string(result.timings))
+    endif
+
+    let g:pymode_lint_queue[result.bufnr] = result
+    if result.bufnr == bufnr('%')
+        call pymode#lint#tick_queue()
+    endif
+endfunction "}}}
 
 
 fun! pymode#lint#tick_queue() "{{{
+    " DESC: Show background check results waiting for the current buffer.
+    "
+    let bufnr = bufnr('%')
+    if !has_key(g:pymode_lint_queue, bufnr)
+        return
+    endif
+    let result = remove(g:pymode_lint_queue, bufnr)
 
-    python import time
-    python print time.time()
+    if has_key(result, 'error')
+        return pymode#error(result.error)
+    endif
 
-    if mode() == 'i'
-        if col('.') == 1
-            call feedkeys("\<Right>\<Left>", "n")
-        else
-            call feedkeys("\<Left>\<Right>", "n")
-        endif
-    else
-        call feedkeys("f\e", "n")
+    if get(result, 'skip', 0)
+        return pymode#wide_message('Skip code checking.')
     endif
+
+    let loclist = g:PymodeLocList.current()
+    let b:pymode_error_line = -1
+    call loclist.clear()
+    call loclist.extend(result.errors)
+    call s:ShowResults(loclist)
+endfunction "}}}
+
+
+fun! pymode#lint#forget(bufnr) "{{{
+    " DESC: Drop the buffer content kept for region checks.
+    "
+    PymodePython lint.forget()
+endfunction "}}}
+
+
+fun! pymode#lint#flush() "{{{
+    " DESC: Drop cached results and pylint state (here and in background).
+    "
+    PymodePython lint.flush()
+    if exists('g:pymode_lint_worker') && g:pymode_lint_worker.running()
+        call g:pymode_lint_worker.send(json_encode({'method': 'flush'}))
+    endif
+    call pymode#wide_message('Code checking caches are flushed.')
 endfunction "}}}
 
 
 fun! pymode#lint#stop() "{{{
-    au! pymode CursorHold <buffer>
+    " DESC: Stop the background checker.
+    "
+    if exists('g:pymode_lint_worker')
+        call g:pymode_lint_worker.stop()
+        unlet g:pymode_lint_worker
+    endif
 endfunction "}}}
 
 
 fun! pymode#lint#start() "{{{
-    au! pymode CursorHold <buffer> call pymode#lint#tick_queue()
-    call pymode#lint#tick_queue()
+    " DESC: Start the background checker (if it is not running yet).
+    "
+    " :return bool: Background checking is available
+    if exists('g:pymode_lint_worker') && g:pymode_lint_worker.running()
+        return 1
+    endif
+    if !g:PymodeJob.supported()
+        return 0
+    endif
+    let g:pymode_lint_worker = g:PymodeJob.start(
+                \ [g:pymode_worker_python, s:worker_script],
+                \ function('s:OnResult'))
+    return g:pymode_lint_worker.running()
 endfunction "}}}
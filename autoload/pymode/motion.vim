@@ -3,6 +3,9 @@
 
 fun! pymode#motion#move(pattern, flags, ...) "{{{
     let cnt = v:count1 - 1
+    if g:pymode_python != 'disable'
+        return s:OutlineMove(a:pattern, a:flags, cnt)
+    endif
     let [line, column] = searchpos(a:pattern, a:flags . 'sW')
     let indent = indent(line)
     while cnt && line
@@ -31,23 +34,18 @@ endfunction "}}}
 fun! pymode#motion#select(first_pattern, second_pattern, inner) "{{{
     let cnt = v:count1 - 1
     let orig = getpos('.')[1:2]
-    let posns = s:BlockStart(orig[0], a:first_pattern, a:second_pattern)
-    if getline(posns[0]) !~ a:first_pattern && getline(posns[0]) !~ a:second_pattern
+    if g:pymode_python != 'disable'
+        let block = s:OutlineBlock(orig[0], a:second_pattern, cnt)
+    else
+        let block = s:SearchBlock(orig[0], a:first_pattern, a:second_pattern, cnt)
+    endif
+    if empty(block)
         return 0
     endif
-    let snum = posns[0]
-    let enum = s:BlockEnd(posns[1], indent(posns[1]))
-    while cnt
-        let lnum = search(a:second_pattern, 'nW')
-        if lnum
-            let enum = s:BlockEnd(lnum, indent(lnum))
-            call cursor(enum, 1)
-        endif
-        let cnt = cnt - 1
-    endwhile
+    let [snum, body, enum] = block
     if pymode#motion#pos_le([snum, 0], orig) && pymode#motion#pos_le(orig, [enum+1, 0])
         if a:inner
-            let snum = posns[1] + 1
+            let snum = body
         endif
 
         call cursor(snum, 1)
@@ -60,6 +58,128 @@ fun! pymode#motion#select_c(pattern, inner) "{{{
     call pymode#motion#select(a:pattern, a:pattern, a:inner)
 endfunction "}}}
 
+fun! s:OutlineMove(pattern, flags, cnt) "{{{
+    " Jump to a definition matching the pattern (see pymode#outline()).
+    let [lines, by_indent] = s:Targets(a:pattern)
+    let [lnum, col] = getpos('.')[1:2]
+    if a:flags =~ 'b'
+        " A line start is before the cursor on other columns
+        let index = s:Bisect(lines, col > 1 ? lnum : lnum - 1) - 1
+    else
+        let index = s:Bisect(lines, lnum)
+    endif
+    if index < 0 || index >= len(lines)
+        return [0, 0]
+    endif
+
+    " Count definitions with the same indent
+    let same = by_indent[indent(lines[index])]
+    let index = s:Bisect(same, lines[index]) - 1
+    let index += a:flags =~ 'b' ? -a:cnt : a:cnt
+    " A count over the definitions stops at the last one of the same indent
+    let index = max([0, min([index, len(same) - 1])])
+    normal! m'
+    call cursor(same[index], 1)
+    return [same[index], 1]
+endfunction "}}}
+
+fun! s:Targets(pattern) "{{{
+    " Return lines of definitions matching the pattern, all and by indent.
+    let entries = pymode#outline()
+    let targets = b:pymode_outline.targets
+    if !has_key(targets, a:pattern)
+        let lines = []
+        let by_indent = {}
+        for entry in entries
+            if getline(entry.line) =~ a:pattern
+                let indent = indent(entry.line)
+                if !has_key(by_indent, indent)
+                    let by_indent[indent] = []
+                endif
+                call add(by_indent[indent], entry.line)
+                call add(lines, entry.line)
+            endif
+        endfor
+        let targets[a:pattern] = [lines, by_indent]
+    endif
+    return targets[a:pattern]
+endfunction "}}}
+
+fun! s:OutlineBlock(lnum, pattern, cnt) "{{{
+    " Return [first line, body, end] of the innermost definition matching the
+    " pattern around the line (with a:cnt definitions after it).
+    let entries = pymode#outline()
+    if !has_key(b:pymode_outline, 'firsts')
+        let b:pymode_outline.firsts = map(copy(entries), 'v:val.first')
+    endif
+
+    " The last definition starting before the line is inside of the
+    " definitions around it
+    let index = s:Bisect(b:pymode_outline.firsts, a:lnum) - 1
+    while index >= 0
+        let entry = entries[index]
+        if getline(entry.line) =~ a:pattern
+            " Comments and blank lines after the body are a part of the block
+            let enum = s:BlockEnd(entry.end, indent(entry.line))
+            if a:lnum <= enum
+                break
+            endif
+        endif
+        let index = entry.parent
+    endwhile
+    if index < 0
+        return []
+    endif
+
+    " Following definitions of the same parent
+    let cnt = a:cnt
+    let last = entry.parent < 0 ? line('$') : entries[entry.parent].end
+    let next = index + 1
+    while cnt && next < len(entries) && entries[next].first <= last
+        if entries[next].parent == entry.parent
+                \ && getline(entries[next].line) =~ a:pattern
+            let enum = s:BlockEnd(entries[next].end, indent(entries[next].line))
+            let cnt -= 1
+        endif
+        let next += 1
+    endwhile
+    return [entry.first, entry.body, enum]
+endfunction "}}}
+
+fun! s:Bisect(list, value) "{{{
+    " Return the number of items of the sorted list up to a:value.
+    let [lo, hi] = [0, len(a:list)]
+    while lo < hi
+        let mid = (lo + hi) / 2
+        if a:list[mid] <= a:value
+            let lo = mid + 1
+        else
+            let hi = mid
+        endif
+    endwhile
+    return lo
+endfunction "}}}
+
+fun! s:SearchBlock(lnum, first_pattern, second_pattern, cnt) "{{{
+    " Return [first line, body, end] of the block around the line found by
+    " searches (without python).
+    let posns = s:BlockStart(a:lnum, a:first_pattern, a:second_pattern)
+    if getline(posns[0]) !~ a:first_pattern && getline(posns[0]) !~ a:second_pattern
+        return []
+    endif
+    let enum = s:BlockEnd(posns[1], indent(posns[1]))
+    let cnt = a:cnt
+    while cnt
+        let lnum = search(a:second_pattern, 'nW')
+        if lnum
+            let enum = s:BlockEnd(lnum, indent(lnum))
+            call cursor(enum, 1)
+        endif
+        let cnt = cnt - 1
+    endwhile
+    return [posns[0], posns[1] + 1, enum]
+endfunction "}}}
+
 fun! s:BlockStart(lnum, first_pattern, second_pattern) "{{{
     let lnum = a:lnum + 1
     let indent = 100
@@ -21,6 +21,9 @@ fun! pymode#rope#complete(dot)
             return ""
         endif
     endif
+    if g:pymode_rope_completion_async && has('timers')
+        return pymode#rope#complete_async(a:dot)
+    endif
     if a:dot
         PymodePython rope.complete(True)
     else
@@ -29,6 +32,49 @@ fun! pymode#rope#complete(dot)
     return pumvisible() && stridx('noselect', &completeopt) != -1 ? "\<C-p>\<Down>" : ""
 endfunction
 
+fun! pymode#rope#complete_async(dot) "{{{
+    " DESC: Start completion in background, show proposals when they are ready.
+    "
+    let l:started = 0
+    if a:dot
+        PymodePython rope.complete_async(True)
+    else
+        PymodePython rope.complete_async()
+    endif
+    if l:started
+        if exists('s:complete_timer')
+            call timer_stop(s:complete_timer)
+        endif
+        let s:complete_timer = timer_start(20, function('s:CompletePoll'), {'repeat': -1})
+    endif
+    return ""
+endfunction "}}}
+
+fun! s:CompletePoll(timer) "{{{
+    let l:waiting = 0
+    PymodePython rope.complete_poll()
+    if !l:waiting
+        call timer_stop(a:timer)
+    endif
+endfunction "}}}
+
+fun! pymode#rope#complete_doc() "{{{
+    " DESC: Show docs of the selected completion item in the info popup.
+    "
+    let id = popup_findinfo()
+    if !id || empty(v:event.completed_item)
+        return
+    endif
+    let l:doc = ''
+    PymodePython rope.complete_doc()
+    if empty(l:doc)
+        call popup_hide(id)
+    else
+        call popup_settext(id, split(l:doc, "\n"))
+        call popup_show(id)
+    endif
+endfunction "}}}
+
 fun! pymode#rope#complete_on_dot() "{{{
     if !exists("*synstack")
         return ""
@@ -62,12 +108,20 @@ endfunction
 
 fun! pymode#rope#find_it()
     let loclist = g:PymodeLocList.current()
+    call loclist.clear()
     let loclist._title = "Occurrences"
     call pymode#wide_message('Finding Occurrences ...')
     PymodePython rope.find_it()
     call loclist.show()
 endfunction
 
+fun! pymode#rope#find_it_add(occurrences) "{{{
+    " DESC: Show occurrences found so far.
+    "
+    call g:PymodeLocList.current().extend(a:occurrences).show()
+    redraw
+endfunction "}}}
+
 
 fun! pymode#rope#show_doc()
     let l:output = []
@@ -88,6 +142,57 @@ fun! pymode#rope#show_doc()
 endfunction
 
 
+fun! pymode#rope#sync(wait) "{{{
+    " DESC: Write data of the changed rope projects (.ropeproject).
+    "
+    if a:wait
+        PymodePython rope.sync()
+    else
+        PymodePython rope.sync(wait=False)
+    endif
+endfunction "}}}
+
+
+fun! pymode#rope#close() "{{{
+    " DESC: Close rope projects and write their data (.ropeproject).
+    "
+    PymodePython rope.close()
+endfunction "}}}
+
+
+fun! pymode#rope#validate() "{{{
+    PymodePython rope.validate()
+endfunction "}}}
+
+fun! pymode#rope#stats() "{{{
+    " DESC: Show cached rope projects in a temp buffer.
+    "
+    let l:output = []
+    PymodePython rope.stats()
+    call pymode#tempbuffer_open('__rope_stats__')
+    call append(0, l:output)
+    setlocal nomodifiable
+    setlocal nomodified
+    normal gg
+    wincmd p
+endfunction "}}}
+
+fun! pymode#rope#symbol(query) "{{{
+    " DESC: Find project definitions by name (the word under cursor by default).
+    "
+    let l:query = empty(a:query) ? expand('<cword>') : a:query
+    let loclist = g:PymodeLocList.current()
+    call loclist.clear()
+    let loclist._title = "Symbols"
+    PymodePython rope.symbol()
+    call loclist.show()
+endfunction "}}}
+
+fun! pymode#rope#update_symbols() "{{{
+    PymodePython rope.update_symbols()
+endfunction "}}}
+
+
 fun! pymode#rope#regenerate() "{{{
     call pymode#wide_message('Regenerate Rope cache ... ')
     PymodePython rope.regenerate()
@@ -170,10 +275,111 @@ fun! pymode#rope#module_to_package() "{{{
     PymodePython rope.ModuleToPackageRefactoring().run()
 endfunction "}}}
 
+fun! pymode#rope#preview_open(lines) "{{{
+    " DESC: Open the refactoring preview. Diffs of files are made when they
+    " come into view.
+    "
+    call pymode#tempbuffer_open('__rope_preview__')
+    call setline(1, a:lines)
+    setlocal nomodifiable nomodified filetype=diff
+    nnoremap <silent> <buffer> <CR> :call <SID>PreviewCall('preview_toggle()')<CR>
+    nnoremap <silent> <buffer> a :call <SID>PreviewCall('preview_mark()')<CR>
+    nnoremap <silent> <buffer> A :call pymode#rope#preview_close(1)<CR>
+    nnoremap <silent> <buffer> q :call pymode#rope#preview_close(0)<CR>
+    au! pymode CursorMoved <buffer> call s:PreviewCall('preview_render()')
+    call s:PreviewCall('preview_render()')
+endfunction "}}}
+
+fun! s:PreviewCall(func) "{{{
+    setlocal modifiable
+    try
+        exe 'PymodePython rope.' . a:func
+    finally
+        setlocal nomodifiable nomodified
+    endtry
+endfunction "}}}
+
+fun! pymode#rope#preview_close(apply) "{{{
+    " DESC: Close the refactoring preview, apply the chosen changes.
+    "
+    let bufnr = bufnr('%')
+    wincmd p
+    exe 'bwipeout ' . bufnr
+    if a:apply
+        PymodePython rope.preview_apply()
+    else
+        PymodePython rope.preview_apply(False)
+    endif
+endfunction "}}}
+
+fun! pymode#rope#reload_buffers(bufnrs, moved) "{{{
+    " DESC: Reload buffers of files changed by a refactoring without
+    " switching windows. a:moved is a list of [bufnr, new path]. Return
+    " the buffers which are not reloaded: modified ones (and moved ones shown
+    " in windows without win_execute()).
+    "
+    let current = bufnr('%')
+    let skipped = []
+    for bufnr in a:bufnrs
+        if bufnr == current
+            " The file may be saved just before (in the same second)
+            silent! e!
+        elseif getbufvar(bufnr, '&modified')
+            call add(skipped, bufnr)
+        else
+            " Reload without a prompt: 'autoread' is set for the buffer only
+            let autoread = getbufvar(bufnr, '&l:autoread', -1)
+            call setbufvar(bufnr, '&autoread', 1)
+            try
+                exe 'silent! checktime ' . bufnr
+            finally
+                call setbufvar(bufnr, '&autoread', autoread)
+            endtry
+        endif
+    endfor
+
+    for [bufnr, path] in a:moved
+        if bufnr == current
+            exe 'e! ' . fnameescape(path)
+        elseif getbufvar(bufnr, '&modified')
+            call add(skipped, bufnr)
+            continue
+        elseif exists('*win_execute')
+            for winid in win_findbuf(bufnr)
+                call win_execute(winid, 'e ' . fnameescape(path))
+            endfor
+        elseif bufwinnr(bufnr) != -1
+            call add(skipped, bufnr)
+            continue
+        endif
+        if bufnr != current && bufexists(bufnr) && !len(win_findbuf(bufnr))
+            exe 'silent! bwipeout ' . bufnr
+        endif
+    endfor
+    return skipped
+endfunction "}}}
+
 fun! pymode#rope#autoimport(word) "{{{
     PymodePython rope.autoimport()
 endfunction "}}}
 
+fun! pymode#rope#autoimport_progress() "{{{
+    " DESC: Show the progress of autoimport cache generated in background.
+    "
+    if !exists('s:autoimport_timer')
+        let s:autoimport_timer = timer_start(200, function('s:AutoimportPoll'), {'repeat': -1})
+    endif
+endfunction "}}}
+
+fun! s:AutoimportPoll(timer) "{{{
+    let l:waiting = 0
+    PymodePython rope.autoimport_poll()
+    if !l:waiting
+        call timer_stop(a:timer)
+        unlet s:autoimport_timer
+    endif
+endfunction "}}}
+
 fun! pymode#rope#generate_function() "{{{
     if !pymode#save()
         return 0
@@ -0,0 +1,104 @@
+" DESC: Line based channel to a background process (Vim 8 and Neovim jobs)
+let g:PymodeJob = {}
+
+
+fun! pymode#tools#job#init() "{{{
+    return
+endfunction "}}}
+
+
+fun! g:PymodeJob.supported() "{{{
+    return has('nvim') || (exists('*job_start') && exists('*ch_sendraw'))
+endfunction "}}}
+
+
+fun! g:PymodeJob.start(cmd, callback) "{{{
+    " DESC: Run cmd; callback is called with every line it writes to stdout.
+    let obj = copy(self)
+    let obj._callback = a:callback
+    let obj._partial = ''
+    let obj._id = 0
+    let obj._job = 0
+    if has('nvim')
+        let obj._id = jobstart(a:cmd, {
+                    \ 'on_stdout': function('s:NvimOutput', [obj]),
+                    \ 'on_stderr': function('s:NvimError'),
+                    \ 'on_exit': function('s:NvimExit', [obj]),
+                    \ })
+    else
+        let obj._job = job_start(a:cmd, {
+                    \ 'mode': 'nl',
+                    \ 'out_cb': function('s:VimOutput', [obj]),
+                    \ 'err_cb': function('s:VimError'),
+                    \ })
+    endif
+    return obj
+endfunction "}}}
+
+
+fun! g:PymodeJob.running() "{{{
+    if has('nvim')
+        return self._id > 0
+    endif
+    return type(self._job) != type(0) && job_status(self._job) == 'run'
+endfunction "}}}
+
+
+fun! g:PymodeJob.send(msg) "{{{
+    if has('nvim')
+        call chansend(self._id, a:msg . "\n")
+    else
+        call ch_sendraw(self._job, a:msg . "\n")
+    endif
+endfunction "}}}
+
+
+fun! g:PymodeJob.stop() "{{{
+    if !self.running()
+        return
+    endif
+    if has('nvim')
+        call jobstop(self._id)
+        let self._id = 0
+    else
+        call job_stop(self._job)
+    endif
+endfunction "}}}
+
+
+fun! s:VimOutput(job, channel, msg) "{{{
+    call a:job._callback(a:msg)
+endfunction "}}}
+
+
+fun! s:VimError(channel, msg) "{{{
+    call pymode#debug('job: ' . a:msg)
+endfunction "}}}
+
+
+fun! s:NvimOutput(job, id, data, event) "{{{
+    " Neovim splits output at arbitrary points: the first item continues the
+    " previous chunk and the last one is incomplete.
+    let lines = copy(a:data)
+    let lines[0] = a:job._partial . lines[0]
+    let a:job._partial = remove(lines, -1)
+    for line in lines
+        if !empty(line)
+            call a:job._callback(line)
+        endif
+    endfor
+endfunction "}}}
+
+
+fun! s:NvimError(id, data, event) "{{{
+    for line in a:data
+        if !empty(line)
+            call pymode#debug('job: ' . line)
+        endif
+    endfor
+endfunction "}}}
+
+
+fun! s:NvimExit(job, id, status, event) "{{{
+    let a:job._id = 0
+endfunction "}}}
@@ -62,6 +62,37 @@ fun! g:PymodeLocList.extend(raw_list) "{{{
 endfunction "}}}
 
 
+fun! g:PymodeLocList.update_region(start, end, delta, sources, raw_list) "{{{
+    " DESC: Replace errors reported by the sources in lines start..end with
+    " raw_list. The region had delta lines less before the change, errors
+    " below it are moved by delta lines.
+    let old_end = a:end - a:delta
+    let issues = []
+    for issue in self.loclist()
+        if issue.lnum > old_end
+            let issue.lnum += a:delta
+        elseif issue.lnum >= a:start
+            if index(a:sources, get(issue, 'source', '')) >= 0
+                continue
+            endif
+            let issue.lnum = max([min([issue.lnum, a:end]), 1])
+        endif
+        call add(issues, issue)
+    endfor
+    call extend(issues, a:raw_list)
+    if empty(g:pymode_lint_sort)
+        call sort(issues, function('s:CompareLines'))
+    endif
+    call self.clear()
+    return self.extend(issues)
+endfunction "}}}
+
+
+fun! s:CompareLines(issue1, issue2) "{{{
+    return a:issue1.lnum - a:issue2.lnum
+endfunction "}}}
+
+
 fun! g:PymodeLocList.filter(filters) "{{{
     let loclist = []
     for error in self.loclist()
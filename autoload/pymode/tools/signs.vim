@@ -24,27 +24,73 @@ fun! g:PymodeSigns.setup() "{{{
     let self._sign_ids = []
     let self._next_id = 10000
     let self._messages = {}
+    let self._buffers = {}
 endfunction "}}}
 
 
 fun! g:PymodeSigns.refresh(loclist) "{{{
-    if self.enabled()
+    " DESC: Show signs of the loclist (and remove other pymode signs). Signs
+    " are kept in the 'pymode' group, only changed lines are updated.
+    "
+    if !self.enabled()
+        return
+    endif
+    if !exists('*sign_placelist')
         call self.clear()
         call self.place(a:loclist)
+        return
     endif
+
+    let wanted = {}
+    for issue in a:loclist.loclist()
+        let signs = get(wanted, issue.bufnr, {})
+        let wanted[issue.bufnr] = signs
+        if !has_key(signs, issue.lnum)
+            let signs[issue.lnum] = 'Pymode' . issue.type[0]
+        endif
+    endfor
+
+    let unplace = []
+    let place = []
+    for bufnr in map(keys(extend(copy(self._buffers), wanted)), 'str2nr(v:val)')
+        if !bufexists(bufnr)
+            continue
+        endif
+        let signs = copy(get(wanted, bufnr, {}))
+        for sign in sign_getplaced(bufnr, {'group': 'pymode'})[0].signs
+            if get(signs, sign.lnum, '') ==# sign.name
+                call remove(signs, sign.lnum)
+            else
+                call add(unplace, {'buffer': bufnr, 'group': 'pymode', 'id': sign.id})
+            endif
+        endfor
+        for [lnum, name] in items(signs)
+            call add(place, {'buffer': bufnr, 'group': 'pymode',
+                           \ 'lnum': str2nr(lnum), 'name': name})
+        endfor
+    endfor
+    call sign_unplacelist(unplace)
+    call sign_placelist(place)
+    let self._buffers = map(wanted, '1')
 endfunction "}}}
 
 
 fun! g:PymodeSigns.clear() "{{{
-    let ids = copy(self._sign_ids)
-    for i in ids
+    if exists('*sign_placelist')
+        call sign_unplace('pymode')
+        let self._buffers = {}
+        return
+    endif
+    for i in self._sign_ids
         execute "sign unplace " . i
-        call remove(self._sign_ids, index(self._sign_ids, i))
     endfor
+    let self._sign_ids = []
 endfunction "}}}
 
 
 fun! g:PymodeSigns.place(loclist) "{{{
+    " DESC: Place signs one by one (Vim without sign_placelist()).
+    "
     let seen = {}
     for issue in a:loclist.loclist()
         if !has_key(seen, issue.lnum)
@@ -87,6 +87,8 @@ if g:pymode_lint
     command! -buffer -nargs=0 PymodeLintAuto :call pymode#lint#auto()
     command! -buffer -nargs=0 PymodeLintToggle :call pymode#lint#toggle()
     command! -buffer -nargs=0 PymodeLint :call pymode#lint#check()
+    command! -buffer -nargs=0 PymodeLintProject :call pymode#lint#project()
+    command! -buffer -nargs=0 PymodeLintFlush :call pymode#lint#flush()
 
     if v:version > 703 || (v:version == 703 && has('patch544'))
         au! QuitPre <buffer> call pymode#quit()
@@ -97,7 +99,13 @@ if g:pymode_lint
     let b:pymode_error_line = -1
 
     if g:pymode_lint_on_fly
-        au! pymode InsertLeave <buffer> PymodeLint
+        if g:pymode_lint_on_fly_region
+            au! pymode InsertLeave <buffer> call pymode#lint#check_region()
+            au! pymode BufUnload,BufDelete <buffer>
+                        \ call pymode#lint#forget(expand('<abuf>'))
+        else
+            au! pymode InsertLeave <buffer> PymodeLint
+        endif
     endif
 
     if g:pymode_lint_message
@@ -105,11 +113,8 @@ if g:pymode_lint
         au! pymode CursorMoved <buffer> call pymode#lint#show_errormessage()
     endif
 
-    " Disabled for current release
     if g:pymode_lint_async
-        " let &l:updatetime = g:pymode_lint_async_updatetime
-        " au! BufEnter <buffer> call pymode#lint#start()
-        " au! BufLeave <buffer> call pymode#lint#stop()
+        au! pymode BufEnter <buffer> call pymode#lint#tick_queue()
     endif
 
 endif
@@ -198,12 +203,23 @@ if g:pymode_rope
         inoremap <silent> <buffer> . .<C-R>=pymode#rope#complete_on_dot()<CR>
     endif
 
+    " Rope projects are kept open, their data is written when Vim is idle
+    au! pymode CursorHold <buffer> call pymode#rope#sync(0)
+    au! pymode VimLeavePre * call pymode#rope#close()
+
+    if g:pymode_rope_completion && exists('##CompleteChanged') && exists('*popup_findinfo')
+        au! pymode CompleteChanged <buffer> call pymode#rope#complete_doc()
+    endif
+
     command! -buffer -nargs=? PymodeRopeNewProject call pymode#rope#new(<f-args>)
     command! -buffer PymodeRopeUndo call pymode#rope#undo()
     command! -buffer PymodeRopeRedo call pymode#rope#redo()
     command! -buffer PymodeRopeRenameModule call pymode#rope#rename_module()
     command! -buffer PymodeRopeModuleToPackage call pymode#rope#module_to_package()
     command! -buffer PymodeRopeRegenerate call pymode#rope#regenerate()
+    command! -buffer PymodeRopeValidate call pymode#rope#validate()
+    command! -buffer PymodeRopeStats call pymode#rope#stats()
+    command! -buffer -nargs=? PymodeSymbol call pymode#rope#symbol(<q-args>)
 
     if g:pymode_rope_autoimport
         command! -buffer PymodeRopeAutoImport call pymode#rope#autoimport(expand('<cword>'))
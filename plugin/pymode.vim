@@ -32,6 +32,9 @@ call pymode#default('g:pymode_warning', 1)
 " Additional python paths
 call pymode#default('g:pymode_paths', [])
 
+" Python interpreter for pymode's background processes
+call pymode#default('g:pymode_worker_python', 'python3')
+
 " Python documentation support
 call pymode#default('g:pymode_doc', 1)
 call pymode#default('g:pymode_doc_bind', 'K')
@@ -42,8 +45,8 @@ call pymode#default("g:pymode_indent", 1)
 " Customize hanging indent size different than &shiftwidth
 call pymode#default("g:pymode_indent_hanging_width", -1)
 
-" TODO: currently folding suffers from a bad performance and incorrect
-" implementation. This feature should be considered experimental.
+" TODO: currently folding suffers from an incorrect implementation. This
+" feature should be considered experimental.
 " Enable/disable pymode folding for pyfiles.
 call pymode#default("g:pymode_folding", 0)
 " Maximum file length to check for nested class/def statements
@@ -107,9 +110,21 @@ call pymode#default('g:pymode_run_bind', '<leader>r')
 call pymode#default('g:pymode_lint', 1)
 
 " Check code asynchronously
-call pymode#default('g:pymode_lint_async', 1)
+call pymode#default('g:pymode_lint_async', 0)
 call pymode#default('g:pymode_lint_async_updatetime', 1000)
 
+" Run code checkers in parallel processes (number of processes, 0 disables)
+call pymode#default('g:pymode_lint_parallel', 0)
+
+" Cache code checking results (number of results kept in memory, 0 disables)
+call pymode#default('g:pymode_lint_cache_size', 100)
+
+" Keep cached results on disk, in .pymode/lint under the project directory
+call pymode#default('g:pymode_lint_cache_persistent', 0)
+
+" Max number of modules pylint keeps parsed between checks
+call pymode#default('g:pymode_lint_pylint_cache_size', 1000)
+
 " Check code every save if file has been modified
 call pymode#default("g:pymode_lint_on_write", 1)
 
@@ -119,6 +134,9 @@ call pymode#default("g:pymode_lint_unmodified", 0)
 " Check code on fly
 call pymode#default("g:pymode_lint_on_fly", 0)
 
+" Check on fly only the changed part of a file with line-local checkers
+call pymode#default("g:pymode_lint_on_fly_region", 0)
+
 " Show message about error in command line
 call pymode#default("g:pymode_lint_message", 1)
 
@@ -201,9 +219,30 @@ if g:pymode_rope
     " If project hasnt been finded in current working directory, look at parents directory
     call pymode#default('g:pymode_rope_lookup_project', 0)
 
+    " Files or folders marking a project root in parent directories (by priority)
+    call pymode#default('g:pymode_rope_project_markers', ['.ropeproject'])
+
+    " Watch project files to check only changed ones before rope operations
+    call pymode#default('g:pymode_rope_watch', 1)
+
+    " Index project definitions for PymodeSymbol and fast goto definition
+    call pymode#default('g:pymode_rope_symbols', 0)
+
+    " Max number of open rope projects (least recently used are closed)
+    call pymode#default('g:pymode_rope_projects_limit', 5)
+
+    " Close least recently used rope projects over this memory (MB, 0 - no limit)
+    call pymode#default('g:pymode_rope_projects_memory_limit', 0)
+
     " Enable Rope completion
     call pymode#default('g:pymode_rope_completion', 1)
 
+    " Complete in background, so typing is not blocked
+    call pymode#default('g:pymode_rope_completion_async', 0)
+
+    " Show recent proposals when completion takes longer (milliseconds)
+    call pymode#default('g:pymode_rope_completion_deadline', 1000)
+
     " Complete keywords from not imported modules (could make completion slower)
     " Enable autoimport used modules
     call pymode#default('g:pymode_rope_autoimport', 0)
@@ -3,9 +3,13 @@
 import sys
 from importlib.machinery import PathFinder as _PathFinder
 
-import vim  # noqa
+try:
+    import vim  # noqa
+except ImportError:
+    # Imported by a code checking process (see pymode.lint_worker)
+    vim = None
 
-if not hasattr(vim, 'find_module'):
+if vim is not None and not hasattr(vim, 'find_module'):
     try:
         vim.find_module = _PathFinder.find_module  # deprecated
     except AttributeError:
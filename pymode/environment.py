@@ -3,18 +3,69 @@
 import json
 import os.path
 import time
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import vim # noqa
 
 
+class BufferSnapshot(object):
+
+    """Source of a buffer with offsets of its lines."""
+
+    __slots__ = 'tick', 'source', 'starts'
+
+    def __init__(self, lines, tick=None):
+        """Join the lines and index them."""
+        self.tick = tick
+        self.source = '\n'.join(lines) + '\n'
+        self.starts = [0]
+        for line in lines:
+            self.starts.append(self.starts[-1] + len(line) + 1)
+
+    def offset(self, row, col):
+        """Get offset of the position (`row` starts from 1).
+
+        :return int|None: None when the row is out of the buffer
+
+        """
+        if not 0 < row < len(self.starts):
+            return None
+        start = self.starts[row - 1]
+        return start + min(col, self.starts[row] - start - 1)
+
+    def line(self, row):
+        """Get the line (`row` starts from 1).
+
+        :return str:
+
+        """
+        return self.source[self.starts[row - 1]:self.starts[row] - 1]
+
+    def position(self, offset):
+        """Get position of the offset.
+
+        :return tuple: (row, col)
+
+        """
+        row = min(bisect_right(self.starts, offset), len(self.starts) - 1)
+        return row, offset - self.starts[row - 1]
+
+
 class VimPymodeEnviroment(object):
 
     """Vim User interface."""
 
     prefix = '[Pymode]'
 
+    # Global variable to pass python values to Vim
+    transfer = 'pymode_transfer'
+
     def __init__(self):
         """Init VIM environment."""
         self.current = vim.current
+        self.snapshots = OrderedDict()
         self.options = dict(encoding=vim.eval('&enc'))
         self.options['debug'] = self.var('g:pymode_debug', True)
 
@@ -72,6 +123,15 @@ class VimPymodeEnviroment(object):
                 value = value
         return value
 
+    @staticmethod
+    def var_list(*names):
+        """Get several vim variables (or expressions) with one call.
+
+        :return list:
+
+        """
+        return vim.eval('[%s]' % ', '.join(names))
+
     @staticmethod
     def message(msg, history=False):
         """Show message to user.
@@ -182,15 +242,56 @@ class VimPymodeEnviroment(object):
 
     def run(self, name, *args):
         """Run vim function."""
-        vim.command('call %s(%s)' % (name, ", ".join([
-            self.prepare_value(a) for a in args
-        ])))
+        with self.convert(args) as values:
+            vim.command('call %s(%s)' % (name, ", ".join(values)))
+
+    def call(self, name, *args):
+        """Run vim function and get its result.
+
+        :return vimobj:
+
+        """
+        with self.convert(args) as values:
+            return vim.eval('%s(%s)' % (name, ", ".join(values)))
 
     def let(self, name, value):
         """Set variable."""
-        cmd = 'let %s = %s' % (name, self.prepare_value(value))
-        self.debug(cmd)
-        vim.command(cmd)
+        self.let_all({name: value})
+
+    def let_all(self, variables):
+        """Set several variables with one command."""
+        names = list(variables)
+        self.debug('let', *names)
+        with self.convert([variables[n] for n in names]) as values:
+            vim.command(' | '.join(
+                'let %s = %s' % (n, v) for n, v in zip(names, values)))
+
+    @contextmanager
+    def convert(self, values):
+        """Pass python values to Vim.
+
+        Values are converted to Vim lists and dictionaries natively (the
+        python interface does it in Vim, the API in Neovim) and put to
+        a global variable for the duration of the block. Values which can't
+        be converted so (e.g. dicts with not string keys) are passed as
+        JSON.
+
+        :return list: Vim expressions for the values
+
+        """
+        try:
+            vim.vars[self.transfer] = list(values)
+        except (TypeError, ValueError, AttributeError, vim.error):
+            yield [self.prepare_value(v) for v in values]
+            return
+
+        try:
+            yield ['g:%s[%d]' % (self.transfer, n) for n in range(len(values))]
+        finally:
+            try:
+                del vim.vars[self.transfer]
+            except (KeyError, vim.error):
+                pass
 
     def prepare_value(self, value, dumps=True):
         """Decode bstr to vim encoding.
@@ -203,6 +304,25 @@ class VimPymodeEnviroment(object):
 
         return value
 
+    def snapshot(self, buf=None):
+        """Get a snapshot of the buffer.
+
+        Snapshots are cached until the buffer's changedtick is changed.
+
+        :return BufferSnapshot:
+
+        """
+        buf = buf or self.curbuf
+        tick = vim.eval('getbufvar(%d, "changedtick")' % buf.number)
+        snapshot = self.snapshots.pop(buf.number, None)
+        if snapshot is None or snapshot.tick != tick:
+            snapshot = BufferSnapshot(buf[:], tick)
+
+        self.snapshots[buf.number] = snapshot
+        while len(self.snapshots) > 10:
+            self.snapshots.popitem(last=False)
+        return snapshot
+
     def get_offset_params(self, cursor=None, base=""):
         """Calculate current offset.
 
@@ -210,16 +330,14 @@ class VimPymodeEnviroment(object):
 
         """
         row, col = cursor or env.cursor
-        source = ""
-        offset = 0
-        for i, line in enumerate(self.lines, 1):
-            if i == row:
-                source += line[:col] + base
-                offset = len(source)
-                source += line[col:]
-            else:
-                source += line
-            source += '\n'
+        snapshot = self.snapshot()
+        source = snapshot.source
+        offset = snapshot.offset(row, col)
+        if offset is None:
+            offset = 0
+        elif base:
+            source = source[:offset] + base + source[offset:]
+            offset += len(base)
         env.debug('Get offset', base or None, row, col, offset)
         return source, offset
 
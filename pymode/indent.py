@@ -0,0 +1,111 @@
+"""Open brackets at the starts of lines (for indentation).
+
+Brackets are found by python tokenizer, so brackets in strings and comments
+are skipped. Lines are scanned without leading whitespace: indentation
+doesn't matter for brackets and wrong indentation can't stop the scan.
+
+"""
+
+import tokenize
+
+from .environment import env
+
+
+def get_brackets():
+    """Set open brackets of the lines from `l:start` to `l:brackets`.
+
+    The lines are scanned at least to `l:stop`.
+
+    pymode: uses it in pymode#indent#get_indent()
+
+    """
+    start, stop = (int(n) for n in env.var_list('l:start', 'l:stop'))
+    states = brackets(_read(env.curbuf, start - 1), stop - start + 1)
+    env.let('l:brackets', [
+        [lnum + start - 1, col] if lnum > 0 else [lnum, col]
+        for lnum, col in states])
+
+
+def brackets(lines, count):
+    """Find the innermost open brackets at the starts of lines.
+
+    The first line should start out of brackets and strings. The scan goes
+    on after `count` lines until a line starts out of brackets and strings
+    (or until the end of lines or a tokenizer error).
+
+    :return list: [lnum, col] for every scanned line: lnum is relative to
+        the first line (from 1) and col is the byte column (from 1) of the
+        bracket after leading whitespace; [0, 0] out of brackets, [-1, 0]
+        in a string out of brackets
+
+    """
+    lines = iter(lines)
+    read = []
+    states = []
+    stack = []
+    string = (0, 0)  # rows of the last multi-line string
+    fstring = 0  # depth of f-strings (python 3.12+)
+    skip = 0  # the row of an unterminated string
+
+    def readline():
+        for line in lines:
+            read.append(None)
+            return line.lstrip(' \t') + '\n'
+        return ''
+
+    def fill(row):
+        while len(states) < min(row, len(read)):
+            inside = fstring or string[0] < len(states) + 1 <= string[1]
+            states.append(list(stack[-1]) if stack else [
+                -1 if inside else 0, 0])
+
+    try:
+        for tok in tokenize.generate_tokens(readline):
+            fill(tok.start[0])
+            if len(states) > count and states[-1] == [0, 0]:
+                return states
+
+            if tok.start[0] == skip:
+                continue
+
+            if tok.type == tokenize.OP and tok.string in '([{':
+                col = len(tok.line[:tok.start[1]].encode('utf-8'))
+                stack.append((tok.start[0], col + 1))
+
+            elif tok.type == tokenize.OP and tok.string in ')]}':
+                if stack:
+                    stack.pop()
+
+            elif tok.type == tokenize.STRING or tok.type == getattr(
+                    tokenize, 'FSTRING_END', None):
+                fstring -= tok.type != tokenize.STRING
+                if tok.end[0] > tok.start[0]:
+                    string = (tok.start[0], tok.end[0])
+
+            elif tok.type == getattr(tokenize, 'FSTRING_START', None):
+                fstring += 1
+
+            elif tok.type == tokenize.ERRORTOKEN and tok.string[:1] in '\'"':
+                # An unterminated string goes to the end of the line
+                skip = tok.start[0]
+
+    except (tokenize.TokenError, SyntaxError) as exc:
+        message = str(exc.args[0])
+        if 'EOF' in message or 'triple-quoted' in message:
+            if 'string' in message:
+                string = (exc.args[1][0], len(read))
+            fill(len(read))
+        else:
+            fill(getattr(exc, 'lineno', None) or exc.args[1][0])
+        return states
+
+    fill(len(read))
+    return states
+
+
+def _read(buf, start, size=200):
+    """Read buffer lines from `start` by slices."""
+    while start < len(buf):
+        for line in buf[start:start + size]:
+            yield line
+        start += size
@@ -1,105 +1,637 @@
 """Pylama integration."""
 
+import bisect
+import json
+import os.path
+import re
+import shutil
+import sys
+import tokenize
+
+from . import lint_worker
 from .environment import env
+from .lint_worker import CACHE, check
 from .utils import silence_stderr
 
-import os.path
 
+# Without the interpreter checks can't run in processes: sys.executable is
+# Vim itself
+lint_worker.PYTHON = shutil.which(env.var('g:pymode_worker_python')) or False
 
-from pylama.lint import LINTERS
+# Checkers which report problems of a line or of a function only
+LOCAL_LINTERS = ('pycodestyle', 'mccabe')
 
-try:
-    from pylama.lint.pylama_pylint import Linter
-    LINTERS['pylint'] = Linter()
-except Exception:  # noqa
-    pass
+# Buffers at the last check: {bufnr: dict(lines=..., tops=...)}, `tops` are
+# the first lines of top level statements (None until a region check)
+SNAPSHOTS = dict()
 
+CLAUSE_RE = re.compile(r'(elif|else|except|finally)\b')
+CLASS_RE = re.compile(r'class\b')
+DEFINITION_RE = re.compile(r'(async\s+def|def|class)\s')
 
-def code_check():
-    """Run pylama and check current file.
+# Top level statements which may come before imports (pycodestyle E402),
+# a bit more than allowed
+PROLOGUE_RE = re.compile(
+    r'(import|from|try|except|else|finally|with|if|elif|__|[bBfFrRuU]*[\'"])')
 
-    :return bool:
+
+def get_lint_params():
+    """Collect code checking params shared by files and projects.
+
+    :return dict:
 
     """
-    with silence_stderr():
+    (linters, ignore, select, sort, parallel, pylint_cache_size,
+     rootdir) = env.var_list(
+         'g:pymode_lint_checkers', 'g:pymode_lint_ignore',
+         'g:pymode_lint_select', 'g:pymode_lint_sort',
+         'g:pymode_lint_parallel', 'g:pymode_lint_pylint_cache_size',
+         'getcwd()')
+    env.debug(linters)
 
-        from pylama.core import run
-        from pylama.config import parse_options
+    # Fixed in v0.9.3: these two parameters may be passed as strings.
+    # DEPRECATE: v:0.10.0: need to be set as lists.
+    if isinstance(ignore, str):
+        raise ValueError('g:pymode_lint_ignore should have a list type')
+    if isinstance(select, str):
+        raise ValueError('g:pymode_lint_select should have a list type')
+    if 'pep8' in linters:
+        # TODO: Add a user visible deprecation warning here
+        env.message('pep8 linter is deprecated, please use pycodestyle.')
+        linters.remove('pep8')
+        linters.append('pycodestyle')
 
-        if not env.curbuf.name:
-            return env.stop()
+    linters_params = dict()
+    options = env.var_list(*[
+        "get(g:, 'pymode_lint_options_%s')" % linter for linter in linters])
+    for linter, opts in zip(linters, options):
+        if opts and opts != '0':
+            linters_params[linter] = opts
 
-        linters = env.var('g:pymode_lint_checkers')
-        env.debug(linters)
+    return dict(
+        rootdir=rootdir,
+        linters=linters,
+        ignore=ignore,
+        select=select,
+        linters_params=linters_params,
+        sort=sort,
+        parallel=int(parallel),
+        pylint_cache_size=int(pylint_cache_size),
+    )
 
-        # Fixed in v0.9.3: these two parameters may be passed as strings.
-        # DEPRECATE: v:0.10.0: need to be set as lists.
-        if isinstance(env.var('g:pymode_lint_ignore'), str):
-            raise ValueError('g:pymode_lint_ignore should have a list type')
-        else:
-            ignore = env.var('g:pymode_lint_ignore')
-        if isinstance(env.var('g:pymode_lint_select'), str):
-            raise ValueError('g:pymode_lint_select should have a list type')
-        else:
-            select = env.var('g:pymode_lint_select')
-        if 'pep8' in linters:
-            # TODO: Add a user visible deprecation warning here
-            env.message('pep8 linter is deprecated, please use pycodestyle.')
-            linters.remove('pep8')
-            linters.append('pycodestyle')
-
-        options = parse_options(
-            linters=linters, force=1,
-            ignore=ignore,
-            select=select,
-        )
-        env.debug(options)
 
-        for linter in linters:
-            opts = env.var('g:pymode_lint_options_%s' % linter, silence=True)
-            if opts:
-                options.linters_params[linter] = options.linters_params.get(
-                    linter, {})
-                options.linters_params[linter].update(opts)
-
-        path = os.path.relpath(env.curbuf.name, env.curdir)
-        env.debug("Start code check: ", path)
-
-        if getattr(options, 'skip', None) and any(p.match(path) for p in options.skip):  # noqa
-            env.message('Skip code checking.')
-            env.debug("Skipped")
+def get_cache_folder(rootdir):
+    """Get a folder to keep code checking results between sessions.
+
+    :return str|None:
+
+    """
+    if env.var('g:pymode_lint_cache_persistent', True):
+        return os.path.join(rootdir, '.pymode', 'lint')
+    return None
+
+
+def get_check_params(lines):
+    """Collect code checking params for the current buffer.
+
+    :return dict|None: Keyword arguments for :func:`lint_worker.check`
+
+    """
+    if not env.curbuf.name:
+        return None
+
+    params = get_lint_params()
+    path = os.path.relpath(env.curbuf.name, params['rootdir'])
+    env.debug("Start code check: ", path)
+
+    params.update(
+        path=path,
+        code='\n'.join(lines) + '\n',
+        cache_size=int(env.var('g:pymode_lint_cache_size')),
+        cache_folder=get_cache_folder(params['rootdir']),
+    )
+    return params
+
+
+def code_check():
+    """Run pylama and check current file.
+
+    :return bool:
+
+    """
+    with silence_stderr():
+
+        lines = list(env.curbuf)
+        params = get_check_params(lines)
+        if params is None:
             return env.stop()
+        take_snapshot(lines)
 
         if env.options.get('debug'):
             import logging
             from pylama.core import LOGGER
             LOGGER.setLevel(logging.DEBUG)
 
-        errors = run(path, code='\n'.join(env.curbuf) + '\n', options=options)
+        timings = dict()
+        errors_list = check(timings=timings, **params)
 
-    env.debug("Find errors: ", len(errors))
-    sort_rules = env.var('g:pymode_lint_sort')
+    env.debug("Lint cache: ", CACHE.stats())
+    env.debug("Checkers time: ", timings)
 
-    def __sort(e):
-        try:
-            return sort_rules.index(e.get('type'))
-        except ValueError:
-            return 999
+    if errors_list is None:
+        env.message('Skip code checking.')
+        env.debug("Skipped")
+        return env.stop()
 
-    if sort_rules:
-        env.debug("Find sorting: ", sort_rules)
-        errors = sorted(errors, key=__sort)
+    env.debug("Find errors: ", len(errors_list))
 
-    errors_list = []
-    for e in errors:
-        if e.col is None:
-            e.col = 1
-        err_dict = e.to_dict()
+    for err_dict in errors_list:
         err_dict['bufnr'] = env.curbuf.number
-        err_dict['type'] = e.etype
-        err_dict['text'] = e.message
-        errors_list.append(err_dict)
 
     env.run('g:PymodeLocList.current().extend', errors_list)
 
+
+def code_check_request():
+    """Prepare a request for the background code checker.
+
+    pymode: uses it in pymode#lint#check() when g:pymode_lint_async is set
+
+    """
+    lines = list(env.curbuf)
+    params = get_check_params(lines)
+    if params is None:
+        return env.stop()
+    take_snapshot(lines)
+
+    request_id = int(env.var('g:pymode_lint_request_id')) + 1
+    env.let_all({
+        'g:pymode_lint_request_id': request_id,
+        'b:pymode_lint_request': request_id,
+    })
+
+    request = dict(
+        id=request_id,
+        method='check',
+        bufnr=env.curbuf.number,
+        paths=sys.path,
+        **params
+    )
+    env.let('l:request', json.dumps(request))
+
+
+def get_project_params():
+    """Collect project checking params.
+
+    :return dict: Keyword arguments for :func:`lint_worker.check_project`
+
+    """
+    params = get_lint_params()
+    params['index_folder'] = get_cache_folder(params['rootdir'])
+    env.debug("Start project check: ", params['rootdir'])
+    return params
+
+
+def code_check_project():
+    """Check all python files of the project.
+
+    Errors of every file are passed to pymode#lint#project_add() as soon as
+    the file is checked.
+
+    pymode: uses it in command PymodeLintProject with pymode#lint#project()
+
+    """
+    with silence_stderr():
+        for path, errors in lint_worker.check_project(**get_project_params()):
+            env.run('pymode#lint#project_add', path, errors)
+
+
+def code_check_project_request():
+    """Prepare a request to check the project in background.
+
+    pymode: uses it in pymode#lint#project() when g:pymode_lint_async is set
+
+    """
+    request_id = int(env.var('g:pymode_lint_request_id')) + 1
+    env.let('g:pymode_lint_request_id', request_id)
+
+    request = dict(
+        id=request_id,
+        method='project',
+        paths=sys.path,
+        **get_project_params()
+    )
+    env.let('l:request', json.dumps(request))
+
+
+def flush():
+    """Drop cached code checking results and pylint state.
+
+    pymode: uses it in command PymodeLintFlush with pymode#lint#flush()
+
+    """
+    lint_worker.flush(get_cache_folder(env.var('getcwd()')))
+    SNAPSHOTS.clear()
+
+
+def take_snapshot(lines):
+    """Keep the current buffer content for region checks.
+
+    Top level statements are kept too when the content hasn't changed.
+
+    """
+    if not env.var(
+            'g:pymode_lint_on_fly && g:pymode_lint_on_fly_region', True):
+        return
+    old = SNAPSHOTS.get(env.curbuf.number)
+    tops = old['tops'] if old and old['lines'] == lines else None
+    SNAPSHOTS[env.curbuf.number] = dict(lines=lines, tops=tops)
+
+
+def forget():
+    """Drop the content kept for region checks of the buffer `a:bufnr`.
+
+    pymode: uses it in pymode#lint#forget() on BufUnload and BufDelete
+
+    """
+    SNAPSHOTS.pop(int(env.var('a:bufnr')), None)
+
+
+def code_check_region():
+    """Check only the part of current file changed since the last check.
+
+    Only line-local checkers (:data:`LOCAL_LINTERS`) are run, on the
+    statements around the changes (see :func:`get_snippets`). Other errors
+    keep their place.
+
+    pymode: uses it in pymode#lint#check_region() (g:pymode_lint_on_fly)
+
+    """
+    snapshot = SNAPSHOTS.get(env.curbuf.number)
+    if snapshot is None:
+        return env.let('l:full', 1)
+
+    with silence_stderr():
+
+        lines = list(env.curbuf)
+        if lines == snapshot['lines']:
+            return env.stop()
+
+        params = get_check_params(lines)
+        if params is None:
+            return env.stop()
+
+        region = get_region(snapshot['lines'], lines, snapshot['tops'])
+        if region is None:
+            env.debug("Check region: can't tokenize the code")
+            return env.let('l:full', 1)
+
+        start, end, rows, code_rows, tops = region
+        SNAPSHOTS[env.curbuf.number] = dict(lines=lines, tops=tops)
+        delta = len(lines) - len(snapshot['lines'])
+        linters = [
+            name for name in params['linters'] if name in LOCAL_LINTERS]
+        if end == len(lines):
+            # Errors at the end of file are reported after the last line
+            end += 1
+        env.debug("Check region: ", start, end, delta, linters)
+
+        # Snippets aren't worth caching: they would push the results of
+        # whole files out of the cache
+        params['cache_size'] = 0
+        params['cache_folder'] = None
+
+        errors_list = []
+        for linter in linters:
+            snippet = code_rows if linter == 'mccabe' else rows
+            if not snippet:
+                continue
+            params['code'] = '\n'.join(
+                lines[n - 1] if n else '' for n in snippet) + '\n'
+            params['linters'] = [linter]
+            for err_dict in check(**params) or []:
+                lnum = err_dict['lnum'] - len(snippet) + snippet[-1]
+                if err_dict['lnum'] <= len(snippet):
+                    lnum = snippet[err_dict['lnum'] - 1]
+                if not start <= lnum <= end or (
+                        err_dict.get('number') == 'W391' and
+                        end <= len(lines)):
+                    continue
+                err_dict['lnum'] = lnum
+                err_dict['bufnr'] = env.curbuf.number
+                errors_list.append(err_dict)
+
+    env.run('g:PymodeLocList.current().update_region',
+            start, end, delta, linters, errors_list)
+
+
+def changed_lines(old, new):
+    """Find lines changed between two versions of a file.
+
+    :return tuple: (first, last) lines of `new` (starting from 1). The range
+        is empty (first > last) when lines have been only removed.
+
+    """
+    limit = min(len(old), len(new))
+
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    return prefix + 1, len(new) - suffix
+
+
+def get_region(old, lines, tops=None):
+    """Find the lines to check after a change of lines.
+
+    Only the top level statements around the change are tokenized when
+    `tops` of `old` are known (see :func:`scan_statements`). Lines after the
+    change are checked too when they are tokenized differently now (e.g.
+    a string has been closed).
+
+    :return tuple|None: (start, end, rows, code_rows, tops), see
+        :func:`get_snippets`. `tops` are top level statements of `lines`.
+        None when the code can't be tokenized.
+
+    """
+    first, last = changed_lines(old, lines)
+    if first > last:
+        first, last = first - 1, first
+    first = max(1, min(first, len(lines)))
+    last = max(first, min(last, len(lines)))
+    delta = len(lines) - len(old)
+
+    # Scan from the statement before the change, or from the last top level
+    # statement which isn't allowed before imports
+    restart, synced, prologue = 1, (), True
+    if tops is not None:
+        n = bisect.bisect_right(tops, first) - 1
+        while n > 0 and (
+                CLAUSE_RE.match(lines[tops[n] - 1]) or
+                lines[tops[n - 1] - 1].startswith('@')):
+            n -= 1
+        n -= 1
+        while n >= 0 and PROLOGUE_RE.match(lines[tops[n] - 1]):
+            n -= 1
+        if n > 0:
+            restart = tops[n]
+        prologue = n < 0
+        synced = set(t + delta for t in tops if t + delta > last)
+
+    def until(lnum, statements):
+        # Tokenizer states at synced lines are the same as before. The top
+        # level statement after the change should be scanned.
+        return (
+            lnum in synced and statements and
+            not CLAUSE_RE.match(lines[lnum - 1]) and
+            not lines[statements[-1][0] - 1].startswith('@') and
+            not (prologue and PROLOGUE_RE.match(lines[lnum - 1])) and
+            next(s for s in reversed(statements) if s[2] < 0)[0] > last)
+
+    scanned = scan_statements(lines, restart, until)
+    if scanned is None:
+        return None
+
+    statements, stop = scanned
+    before = scan_statements(
+        old, restart, lambda lnum, _: stop and lnum + delta == stop)
+    if before is None or shape(before[0], last - delta, delta) != shape(
+            statements, last):
+        last = (stop or len(lines) + 1) - 1
+
+    window = [s[0] for s in statements if s[2] < 0]
+    if tops is None:
+        tops = window
+    else:
+        tops = [t for t in tops if t < restart] + window + [
+            t + delta for t in tops if stop and t + delta >= stop]
+
+    return get_snippets(lines, statements, first, last) + (tops,)
+
+
+def get_snippets(lines, statements, first, last):
+    """Find the statements to check for changed lines.
+
+    The region is made of whole statements touched by the change (with
+    their decorators and `else`/`except` clauses), lifted out of functions:
+    a change in a method checks the method, not the class. The header of
+    the next statement is checked too, as blank lines before it may have
+    changed.
+
+    :return tuple: (start, end, rows, code_rows): the region lines, lines
+        of the snippet to check (with headers of classes around and the
+        statement before the region, so blank lines are counted right) and
+        lines of the snippet for checkers which compile the code (0 for
+        blank lines)
+
+    """
+    def text(index):
+        return lines[statements[index][0] - 1].lstrip()
+
+    def is_clause(index):
+        return bool(CLAUSE_RE.match(text(index)))
+
+    def is_decorator(index):
+        return text(index).startswith('@')
+
+    def is_one_liner(index):
+        return statements[index][1] == statements[index][3] and bool(
+            DEFINITION_RE.match(text(index)))
+
+    def chain(index):
+        indexes = []
+        while index >= 0:
+            indexes.append(index)
+            index = statements[index][2]
+        return indexes[::-1]
+
+    # A change between statements is a change of the statement before
+    touched = [
+        i for i, s in enumerate(statements) if s[0] <= last and s[1] >= first]
+    if not touched:
+        touched = [i for i, s in enumerate(statements) if s[1] < first][-1:]
+
+    parent, items = -1, []
+    if touched:
+        chains = [chain(i) for i in touched]
+        depth = 0
+        while all(len(c) > depth and c[depth] == chains[0][depth]
+                  for c in chains):
+            depth += 1
+        parent = chains[0][depth - 1] if depth else -1
+        if any(len(c) == depth for c in chains):
+            items, parent = [parent], statements[parent][2]
+        else:
+            items = [c[depth] for c in chains]
+
+        # Check whole functions (and other blocks), but not whole classes
+        while parent >= 0 and not all(
+                CLASS_RE.match(text(i)) for i in chain(parent)):
+            items, parent = [parent], statements[parent][2]
+
+    siblings = [i for i, s in enumerate(statements) if s[2] == parent]
+    start, end = first, last
+    if items:
+        lo, hi = siblings.index(min(items)), siblings.index(max(items))
+        # One-liner definitions are told by the next line (pycodestyle)
+        while lo > 0 and (
+                is_clause(siblings[lo]) or is_decorator(siblings[lo - 1]) or
+                is_one_liner(siblings[lo - 1])):
+            lo -= 1
+        while hi + 1 < len(siblings) and (
+                is_clause(siblings[hi + 1]) or is_decorator(siblings[hi])):
+            hi += 1
+        start = min(first, statements[siblings[lo]][0])
+        end = max(last, statements[siblings[hi]][3])
+
+    code = [s for s in statements if s[2] < 0 and s[0] < start and
+            not PROLOGUE_RE.match(lines[s[0] - 1])]
+    prologue = parent < 0 and not code
+    if prologue:
+        # Imports after the change may be at the top of file now (or not)
+        for s in statements:
+            if s[2] < 0 and s[0] > end:
+                if not PROLOGUE_RE.match(lines[s[0] - 1]):
+                    break
+                end = s[3]
+
+    # Blank lines are counted before comments and the next statement. The
+    # statement is compiled whole, only its header (with decorators) is
+    # checked.
+    following = next(
+        (i for i, s in enumerate(statements) if s[0] > end), None)
+    code_end = end = len(lines)
+    if following is not None:
+        while is_decorator(following) and following + 1 < len(statements):
+            following += 1
+        end = statements[following][1]
+        code_end = statements[following][3]
+
+    headers = []
+    for i in chain(parent):
+        headers.extend(range(statements[i][0], statements[i][1] + 1))
+
+    rows = list(headers)
+    gap = statements[parent][1] + 1 if parent >= 0 else 1
+    before = [statements[i] for i in siblings if statements[i][0] < start]
+    if parent < 0 and code and code[-1] is not before[-1]:
+        # Imports aren't at the top of file after this one
+        rows.extend(range(code[-1][0], code[-1][1] + 1))
+    if before and not prologue:
+        context = before[-1]
+        inner = [s for s in statements if context[0] <= s[0] <= context[3]]
+        rows.extend(range(context[0], context[1] + 1))
+        if inner[-1] is not context:
+            rows.extend(range(inner[-1][0], inner[-1][1] + 1))
+        gap = context[3] + 1
+    rows.extend(range(gap, end + 1))
+
+    # Definitions are told from one-liners by the next line
+    after = next((n for n in range(end + 1, len(lines) + 1)
+                  if lines[n - 1].strip()), None)
+    if after:
+        rows.append(after)
+
+    # Lines are kept in place (blank), mccabe names blocks by line numbers
+    headers = set(headers)
+    code_rows = [n if n in headers else 0 for n in range(1, start)]
+    code_rows.extend(range(start, code_end + 1))
+
+    return start, end, rows, code_rows
+
+
+def shape(statements, after, delta=0):
+    """Describe statements starting after a line, moved by `delta` lines.
+
+    :return list: (first, last, end, depth) of the statements
+
+    """
+    depths = []
+    result = []
+    for first, last, parent, end in statements:
+        depths.append(depths[parent] + 1 if parent >= 0 else 0)
+        if first > after:
+            result.append((first + delta, last + delta, end + delta,
+                           depths[-1]))
+    return result
+
+
+def scan_statements(lines, start=1, until=None):
+    """Find logical lines of the code with python tokenizer.
+
+    Lines are scanned from `start` (which should begin a top level
+    statement) to the end, or to a top level statement starting at a line
+    `lnum` when `until(lnum, statements)` is true.
+
+    :return tuple|None: (statements, lnum where the scan has stopped or
+        None). Statements are lists [first, last, parent, end]: lines of the
+        logical line, index of the statement it's nested in (-1 at the top
+        level) and the last line of its block. None when the code can't be
+        tokenized.
+
+    """
+    rows = iter(range(start - 1, len(lines)))
+    statements = []
+    stack = []
+    begin = True
+    brackets = 0
+
+    def readline():
+        for row in rows:
+            return lines[row] + '\n'
+        return ''
+
+    def add(lnum):
+        statements.append([lnum, lnum, stack[-1] if stack else -1, lnum])
+
+    def close(lnum):
+        statements[-1][1] = lnum
+        index = len(statements) - 1
+        while index >= 0:
+            statements[index][3] = lnum
+            index = statements[index][2]
+
+    try:
+        for tok in tokenize.generate_tokens(readline):
+            lnum = tok.start[0] + start - 1
+
+            if tok.type == tokenize.INDENT:
+                stack.append(len(statements) - 1)
+
+            elif tok.type == tokenize.DEDENT:
+                stack.pop()
+
+            elif tok.type == tokenize.NEWLINE:
+                close(lnum)
+                begin = True
+
+            elif begin and tok.type not in (
+                    tokenize.NL, tokenize.COMMENT, tokenize.ENDMARKER):
+                begin = False
+                if not stack and until and until(lnum, statements):
+                    return statements, lnum
+                add(lnum)
+
+            if tok.type == tokenize.OP and tok.string in '()[]{}':
+                brackets += 1 if tok.string in '([{' else -1
+                if brackets < 0:
+                    # Python tokenizer goes on as if in brackets
+                    return None
+
+    except tokenize.TokenError as exc:
+        message = str(exc.args[0])
+        if 'EOF' not in message and 'triple-quoted' not in message:
+            return None
+        if begin:
+            add(exc.args[1][0] + start - 1)
+        close(len(lines))
+
+    except SyntaxError:
+        return None
+
+    return statements, None
+
 # pylama:ignore=W0212,E1103
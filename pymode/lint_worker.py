@@ -0,0 +1,1146 @@
+"""Run code checkers without Vim.
+
+The module is shared by :func:`pymode.lint.code_check`, which calls
+:func:`check` inside Vim, and by the background worker that pymode starts
+as ``python3 pymode/lint_worker.py`` (see ``pymode#lint#start()``). It must
+never import ``vim``.
+
+The worker reads one JSON request per line from stdin and writes one JSON
+response per line to stdout.
+
+"""
+
+import copy
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import os.path
+import sys
+import threading
+import time
+import tokenize
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from queue import Queue
+
+if __name__ == '__main__':
+    # Started as a script: drop the package dir from sys.path (it shadows
+    # the bundled libraries, e.g. ``rope``) and make those importable.
+    ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path[0] = ROOT
+    sys.path.insert(0, os.path.join(ROOT, 'pymode', 'libs'))
+
+
+class PylintSession(object):
+
+    """Keep pylint linters and astroid caches between checks.
+
+    Pylama runs pylint as ``Run(args, reporter=reporter, exit=False)``; the
+    session replaces ``Run`` and reuses the linter created for the same
+    project (:attr:`root`, set before a check) and options. Astroid modules
+    are kept while their files are unchanged, at most `maxsize` of them
+    (the least recently used are dropped). Modules of a project are dropped
+    when another project is checked.
+
+    """
+
+    def __init__(self, maxsize=1000):
+        """Init the session."""
+        self.maxsize = maxsize
+        self.root = None
+        self._root = None
+        self._linters = dict()
+        self._mtimes = OrderedDict()
+
+    def __call__(self, args, reporter=None, exit=True):  # noqa
+        """Check files with pylint."""
+        from pylint.lint import Run
+
+        options = [a for a in args if a.startswith('-')]
+        files = [a for a in args if not a.startswith('-')]
+
+        if self.root != self._root:
+            self.forget_folder(self._root)
+            self._root = self.root
+
+        self.validate()
+        linter = None
+        try:
+            linter_options, linter = self._linters.get(
+                self.root, (None, None))
+            if linter is None or options != linter_options:
+                linter = Run(args, reporter=reporter, exit=False).linter
+                self._linters[self.root] = options, linter
+
+            else:
+                linter.set_reporter(reporter)
+                linter.check(files)
+
+        finally:
+            self.forget(files)
+            self.update(linter)
+            self.shrink()
+
+    @staticmethod
+    def _cache():
+        from astroid import MANAGER
+        return MANAGER.astroid_cache
+
+    def validate(self):
+        """Drop modules changed on disk since they were loaded."""
+        cache = self._cache()
+        for name, mtime in list(self._mtimes.items()):
+            module = cache.get(name)
+            if module is None or _getmtime(module.file) != mtime:
+                cache.pop(name, None)
+                del self._mtimes[name]
+
+    def update(self, linter=None):
+        """Remember modules loaded by a check.
+
+        Modules imported by the checked files are moved to the end of the
+        LRU order.
+
+        """
+        for name, module in self._cache().items():
+            if name not in self._mtimes and getattr(module, 'file', None):
+                self._mtimes[name] = _getmtime(module.file)
+
+        stats = getattr(linter, 'stats', None)
+        if isinstance(stats, dict):
+            dependencies = stats.get('dependencies')
+        else:
+            dependencies = getattr(stats, 'dependencies', None)
+        for name in dependencies or ():
+            if name in self._mtimes:
+                self._mtimes.move_to_end(name)
+
+    def forget(self, files):
+        """Drop modules loaded from the given files."""
+        files = set(os.path.abspath(f) for f in files)
+        self._drop(lambda path: path in files)
+
+    def forget_folder(self, folder):
+        """Drop modules loaded from files in the folder."""
+        if folder:
+            folder = os.path.join(os.path.abspath(folder), '')
+            self._drop(lambda path: path.startswith(folder))
+            self._clear_inference()
+
+    def _drop(self, match):
+        cache = self._cache()
+        for name, module in list(cache.items()):
+            path = getattr(module, 'file', None)
+            if path and match(os.path.abspath(path)):
+                del cache[name]
+                self._mtimes.pop(name, None)
+
+    def shrink(self):
+        """Drop the least recently used modules when there are too many."""
+        cache = self._cache()
+        while len(self._mtimes) > self.maxsize:
+            name, _ = self._mtimes.popitem(last=False)
+            cache.pop(name, None)
+
+    def flush(self):
+        """Drop the linters and all the astroid caches."""
+        from astroid import MANAGER
+
+        self._linters.clear()
+        self._mtimes.clear()
+        self._root = None
+        MANAGER.clear_cache()
+        self._clear_inference()
+
+    @staticmethod
+    def _clear_inference():
+        """Drop inference results (they keep nodes of dropped modules)."""
+        from astroid import context, inference_tip
+
+        for clear in (
+                getattr(inference_tip, 'clear_inference_tip_cache', None),
+                getattr(context, '_invalidate_cache', None)):
+            if clear is not None:
+                clear()
+
+
+def _getmtime(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None
+
+
+SESSION = PylintSession()
+
+try:
+    from pylama.lint import pylama_pylint
+    pylama_pylint.Run = SESSION
+except ImportError:
+    pass
+
+
+class ResultCache(object):
+
+    """LRU cache for check results.
+
+    Results are keyed by a hash of the code and of everything which changes
+    checkers output. Optionally results are stored on disk as well (at most
+    `disk_maxsize` of them in a folder, least recently used are removed).
+
+    """
+
+    def __init__(self, maxsize=100, disk_maxsize=1000):
+        """Init the cache."""
+        self.maxsize = maxsize
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._folders = set()
+
+    def __len__(self):
+        return len(self._data)
+
+    @staticmethod
+    def key(code, **params):
+        """Get a key for the code checked with the given params.
+
+        :return str:
+
+        """
+        sha = hashlib.sha1(code.encode('utf-8'))
+        sha.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return sha.hexdigest()
+
+    def get(self, key, folder=None):
+        """Get cached errors.
+
+        :return list|None:
+
+        """
+        if key in self._data:
+            self._data.move_to_end(key)
+            errors = self._data[key]
+
+        else:
+            errors = self._load(key, folder)
+            if errors is None:
+                self.misses += 1
+                return None
+            self._store(key, errors)
+
+        self.hits += 1
+        return [dict(e) for e in errors]
+
+    def set(self, key, errors, folder=None):
+        """Cache errors."""
+        errors = [dict(e) for e in errors]
+        self._store(key, errors)
+        if folder:
+            self._folders.add(folder)
+            self._dump(key, errors, folder)
+            self._prune(folder)
+
+    def clear(self, folder=None):
+        """Drop all cached results (from disk too).
+
+        Results are removed from the used folders and from `folder`.
+
+        """
+        self._data.clear()
+        self.hits = self.misses = 0
+        if folder:
+            self._folders.add(folder)
+        for folder in self._folders:
+            for path in self._files(folder):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._folders.clear()
+
+    def stats(self):
+        """Return cache counters.
+
+        :return dict:
+
+        """
+        return dict(
+            hits=self.hits, misses=self.misses, size=len(self._data),
+            maxsize=self.maxsize)
+
+    def _store(self, key, errors):
+        self._data[key] = errors
+        self._data.move_to_end(key)
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+
+    def _load(self, key, folder):
+        if not folder:
+            return None
+        self._folders.add(folder)
+        path = os.path.join(folder, key + '.json')
+        try:
+            with open(path) as f:
+                errors = json.load(f)
+            # Mark the file as recently used
+            os.utime(path)
+            return errors
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _dump(key, errors, folder):
+        path = os.path.join(folder, key + '.json')
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(errors, f)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+    def _prune(self, folder):
+        """Remove least recently used results over `disk_maxsize`."""
+        paths = self._files(folder)
+        if len(paths) <= self.disk_maxsize:
+            return
+
+        def _mtime(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0
+
+        for path in sorted(paths, key=_mtime)[:len(paths) - self.disk_maxsize]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _files(folder):
+        """Find files of cached results in the folder.
+
+        :return list:
+
+        """
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            return []
+        return [
+            os.path.join(folder, name) for name in names
+            if len(name) == 45 and name.endswith('.json')]
+
+
+CACHE = ResultCache()
+
+# Files with pylama options in the project root
+CONFIG_FILES = ('pylama.ini', 'setup.cfg', 'tox.ini', 'pytest.ini',
+                'pyproject.toml')
+
+# Modules of pylama linters
+LINTER_MODULES = dict(
+    pep8='pycodestyle', pycodestyle='pycodestyle', pep257='pydocstyle',
+    pydocstyle='pydocstyle', pyflakes='pyflakes', mccabe='mccabe',
+    pylint='pylint', radon='radon', eradicate='eradicate', mypy='mypy',
+    isort='isort', vulture='vulture')
+
+VERSIONS = dict()
+
+
+def get_stamp(rootdir, linters):
+    """Get mtimes of the pylama config files and versions of the linters.
+
+    Cached results are dropped when any of them changes.
+
+    :return dict:
+
+    """
+    config = dict()
+    for name in CONFIG_FILES:
+        try:
+            config[name] = os.path.getmtime(os.path.join(rootdir, name))
+        except OSError:
+            continue
+
+    for name in ['pylama'] + list(linters):
+        if name not in VERSIONS:
+            module = LINTER_MODULES.get(name, name)
+            try:
+                VERSIONS[name] = str(getattr(
+                    __import__(module), '__version__', None))
+            except Exception:  # noqa
+                VERSIONS[name] = None
+
+    return dict(config=config, versions=dict(
+        (name, VERSIONS[name]) for name in ['pylama'] + list(linters)))
+
+
+def get_options(rootdir, linters, ignore=(), select=(), linters_params=None):
+    """Build pylama options.
+
+    :return Namespace:
+
+    """
+    from pylama.config import parse_options
+
+    options = parse_options(
+        linters=linters, force=1,
+        ignore=ignore,
+        select=select,
+        rootdir=Path(rootdir),
+    )
+
+    for linter, opts in (linters_params or {}).items():
+        if opts:
+            options.linters_params[linter] = options.linters_params.get(
+                linter, {})
+            options.linters_params[linter].update(opts)
+
+    return options
+
+
+# Process pools by name: (pool, number of processes)
+POOLS = dict()
+
+POOL_LOCK = threading.Lock()
+
+# Interpreter for the pool processes (inside Vim sys.executable is Vim):
+# None is sys.executable, False disables the pools (checks run one by one).
+PYTHON = None
+
+
+def get_pool(size, name='check'):
+    """Get a process pool for the checkers.
+
+    The pool is kept alive between checks and recreated when its size has
+    been changed. Project checks use a pool of their own, so they don't
+    break the pool of buffer checks running meanwhile.
+
+    :return ProcessPoolExecutor:
+
+    """
+    with POOL_LOCK:
+        pool, pool_size = POOLS.get(name, (None, 0))
+        if pool is not None and pool_size != size:
+            pool.shutdown(wait=False)
+            pool = None
+
+        if pool is None:
+            context = multiprocessing.get_context('spawn')
+            if PYTHON:
+                context.set_executable(PYTHON)
+            pool = ProcessPoolExecutor(max_workers=size, mp_context=context)
+            POOLS[name] = pool, size
+
+        return pool
+
+
+def reset_pool(name=None):
+    """Shut down the pool `name` or all the pools.
+
+    A new pool is made by the next check.
+
+    """
+    with POOL_LOCK:
+        for key in [name] if name else list(POOLS):
+            pool, _ = POOLS.pop(key, (None, 0))
+            if pool is not None:
+                pool.shutdown(wait=False)
+
+
+def check(path, code, rootdir, linters, ignore=(), select=(),
+          linters_params=None, sort=None, cache_size=0, cache_folder=None,
+          parallel=0, timings=None, pylint_cache_size=None):
+    """Check the given code.
+
+    When `cache_size` is set results are taken from (and put to) the
+    :data:`CACHE`; `cache_folder` keeps them on disk between sessions.
+
+    When `parallel` is set every checker runs in its own process of a pool
+    with (at most) that many processes. Time spent by the checkers is
+    put to the `timings` dict.
+
+    `pylint_cache_size` limits the number of modules kept by the
+    :data:`SESSION` between checks.
+
+    :return list|None: Errors as dicts ready for the loclist or None when
+        the path is skipped by pylama options.
+
+    """
+    key = None
+    if cache_size:
+        CACHE.maxsize = cache_size
+        key = CACHE.key(
+            code, path=path, rootdir=rootdir, linters=linters, ignore=ignore,
+            select=select, linters_params=linters_params, sort=sort,
+            stamp=get_stamp(rootdir, linters))
+        errors_list = CACHE.get(key, cache_folder)
+        if errors_list is not None:
+            return errors_list
+
+    errors_list = _check(
+        path, code, rootdir, linters, ignore, select, linters_params, sort,
+        parallel, timings if timings is not None else {}, pylint_cache_size)
+
+    if key and errors_list is not None:
+        CACHE.set(key, errors_list, cache_folder)
+
+    return errors_list
+
+
+def _check(path, code, rootdir, linters, ignore, select, linters_params,
+           sort, parallel, timings, pylint_cache_size):
+    options = get_options(rootdir, linters, ignore, select, linters_params)
+
+    if getattr(options, 'skip', None) and any(p.match(path) for p in options.skip):  # noqa
+        return None
+
+    if parallel and len(linters) > 1 and PYTHON is not False:
+        errors = _run_parallel(
+            path, code, rootdir, options, parallel, timings,
+            pylint_cache_size)
+
+    else:
+        _, timings[', '.join(linters)], errors = _run(
+            path, code, rootdir, options, pylint_cache_size)
+
+    if sort:
+        def __sort(e):
+            try:
+                return sort.index(e.etype)
+            except ValueError:
+                return 999
+
+        errors = sorted(errors, key=__sort)
+
+    errors_list = []
+    for e in errors:
+        if e.col is None:
+            e.col = 1
+        err_dict = e.to_dict()
+        err_dict['type'] = e.etype
+        err_dict['text'] = e.message
+        errors_list.append(err_dict)
+
+    return errors_list
+
+
+def flush(cache_folder=None):
+    """Drop all the cached results and pylint state.
+
+    Results kept on disk are removed from `cache_folder` as well.
+
+    """
+    CACHE.clear(cache_folder)
+    PROJECTS.clear()
+    SESSION.flush()
+    reset_pool()
+
+
+CHECK_PARAMS = (
+    'path', 'code', 'rootdir', 'linters', 'ignore', 'select',
+    'linters_params', 'sort', 'cache_size', 'cache_folder', 'parallel',
+    'pylint_cache_size')
+
+
+def _run(path, code, rootdir, options, pylint_cache_size=None):
+    """Run pylama with the given options.
+
+    :return tuple: (linters, elapsed time, errors)
+
+    """
+    from pylama.core import run
+
+    if pylint_cache_size is not None:
+        SESSION.maxsize = pylint_cache_size
+    SESSION.root = rootdir
+
+    start = time.time()
+    errors = run(
+        os.path.join(rootdir, path), code=code, rootdir=Path(rootdir),
+        options=options)
+    return options.linters, time.time() - start, errors
+
+
+def _run_parallel(path, code, rootdir, options, parallel, timings,
+                  pylint_cache_size):
+    """Run every checker in a process of the pool.
+
+    Results are merged the same way pylama merges them.
+
+    :return list:
+
+    """
+    from pylama.errors import default_sorter, remove_duplicates
+
+    for attempt in range(2):
+        try:
+            pool = get_pool(parallel)
+            futures = []
+            for linter in options.linters:
+                linter_options = copy.copy(options)
+                linter_options.linters = [linter]
+                futures.append(pool.submit(
+                    _run, path, code, rootdir, linter_options,
+                    pylint_cache_size))
+            results = [future.result() for future in futures]
+            break
+
+        except BrokenProcessPool:
+            # A process of the pool has crashed: try once with a new pool
+            reset_pool('check')
+            if attempt:
+                raise
+
+    errors = []
+    for linters, elapsed, linter_errors in results:
+        timings[', '.join(linters)] = elapsed
+        errors.extend(linter_errors)
+
+    return sorted(remove_duplicates(errors), key=default_sorter)
+
+
+class GitIgnore(object):
+
+    """Match paths with ``.gitignore`` patterns.
+
+    The common syntax is supported: comments, ``!`` negation, trailing ``/``
+    for directories and patterns anchored with ``/``. Patterns of a nested
+    ``.gitignore`` apply to paths in its folder only.
+
+    """
+
+    def __init__(self):
+        """Init the matcher."""
+        self._rules = []
+
+    def load(self, folder, prefix=''):
+        """Read ``.gitignore`` in the folder.
+
+        `prefix` is the relative path of the folder.
+
+        """
+        try:
+            with open(os.path.join(folder, '.gitignore')) as f:
+                lines = f.read().splitlines()
+        except (OSError, ValueError):
+            return
+
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+
+            dironly = line.endswith('/')
+            pattern = line.rstrip('/')
+            anchored = '/' in pattern
+            pattern = pattern.lstrip('/')
+            if anchored and prefix:
+                pattern = prefix + '/' + pattern
+
+            self._rules.append((prefix, pattern, anchored, dironly, negate))
+
+    def match(self, path, isdir=False):
+        """Check the path (relative to the project root) is ignored.
+
+        :return bool:
+
+        """
+        path = path.replace(os.sep, '/')
+        name = path.rsplit('/', 1)[-1]
+        ignored = False
+        for prefix, pattern, anchored, dironly, negate in self._rules:
+            if dironly and not isdir:
+                continue
+            if prefix and not path.startswith(prefix + '/'):
+                continue
+            if fnmatch.fnmatchcase(path if anchored else name, pattern):
+                ignored = not negate
+        return ignored
+
+
+def project_files(rootdir, skip=()):
+    """Find python files of the project.
+
+    Hidden folders, paths ignored by ``.gitignore`` files and paths matched
+    by pylama `skip` patterns are left out.
+
+    :return list: Paths relative to `rootdir`
+
+    """
+    ignore = GitIgnore()
+    paths = []
+
+    for folder, dirs, files in os.walk(rootdir):
+        prefix = os.path.relpath(folder, rootdir)
+        prefix = '' if prefix == os.curdir else prefix.replace(os.sep, '/')
+        ignore.load(folder, prefix)
+
+        dirs[:] = sorted(
+            name for name in dirs if not name.startswith('.') and
+            not ignore.match(os.path.join(prefix, name), isdir=True))
+
+        for name in sorted(files):
+            path = os.path.join(prefix, name)
+            if not name.endswith('.py') or ignore.match(path):
+                continue
+            if any(p.match(path) for p in skip):
+                continue
+            paths.append(path)
+
+    return paths
+
+
+def read_file(path):
+    """Read a python file respecting its coding cookie.
+
+    :return str:
+
+    """
+    try:
+        with tokenize.open(path) as f:
+            return f.read()
+    except (SyntaxError, UnicodeDecodeError):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read()
+
+
+class ProjectIndex(object):
+
+    """Errors of the project files with their mtime and content hash.
+
+    Entries are dropped when checking params change. The index is kept on
+    disk when `folder` is set.
+
+    """
+
+    def __init__(self, folder=None):
+        """Init the index."""
+        self.path = folder and os.path.join(folder, 'project.json')
+        self.params = None
+        self.files = dict()
+        if self.path:
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                self.params, self.files = data['params'], data['files']
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+    def reset(self, params, paths):
+        """Forget the removed files and everything when params changed."""
+        params = ResultCache.key(
+            '', stamp=get_stamp(params['rootdir'], params['linters']),
+            **params)
+        if params != self.params:
+            self.params = params
+            self.files = dict()
+        paths = set(paths)
+        for path in list(self.files):
+            if path not in paths:
+                del self.files[path]
+
+    def lookup(self, path, fullpath):
+        """Find errors of the file unchanged since the last check.
+
+        :return tuple: (errors or None, code of the file or None)
+
+        """
+        stat = os.stat(fullpath)
+        stamp = [stat.st_mtime, stat.st_size]
+        entry = self.files.get(path)
+        if entry and entry['stamp'] == stamp:
+            return entry['errors'], None
+
+        code = read_file(fullpath)
+        sha = hashlib.sha1(code.encode('utf-8')).hexdigest()
+        if entry and entry['sha'] == sha:
+            entry['stamp'] = stamp
+            return entry['errors'], code
+
+        self.files[path] = dict(stamp=stamp, sha=sha, errors=None)
+        return None, code
+
+    def update(self, path, errors):
+        """Keep errors of the checked file."""
+        self.files[path]['errors'] = errors
+
+    def save(self):
+        """Write the index to disk."""
+        if not self.path:
+            return
+        files = dict(
+            (path, entry) for path, entry in self.files.items()
+            if entry['errors'] is not None)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(dict(params=self.params, files=files), f)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError:
+            pass
+
+
+# Project indexes by root dir
+PROJECTS = dict()
+
+
+def check_project(rootdir, linters, ignore=(), select=(), linters_params=None,
+                  sort=None, parallel=0, index_folder=None,
+                  pylint_cache_size=None):
+    """Check python files of the project.
+
+    Changed files are checked in the process pool (of `parallel` or CPU
+    count processes, shut down when the check is finished or cancelled).
+    Errors of files unchanged since the previous run are taken from the
+    :class:`ProjectIndex` (kept on disk in `index_folder`).
+
+    A file which can't be checked gets a single error with the reason. When
+    a process of the pool crashes the files left are checked once more one
+    by one. Without pools (see :data:`PYTHON`) files are checked in this
+    process.
+
+    :return generator: (path, errors) for every file as soon as it's checked
+
+    """
+    params = dict(
+        rootdir=rootdir, linters=linters, ignore=ignore, select=select,
+        linters_params=linters_params, sort=sort)
+
+    options = get_options(rootdir, linters, ignore, select, linters_params)
+    paths = project_files(rootdir, getattr(options, 'skip', None) or ())
+
+    index = PROJECTS.get(rootdir)
+    if index is None or index.path != (
+            index_folder and os.path.join(index_folder, 'project.json')):
+        index = PROJECTS[rootdir] = ProjectIndex(index_folder)
+    index.reset(params, paths)
+
+    codes = dict()
+    futures = dict()
+    try:
+        for path in paths:
+            try:
+                errors, code = index.lookup(path, os.path.join(rootdir, path))
+            except OSError:
+                continue
+
+            if errors is not None:
+                yield path, errors
+                continue
+
+            codes[path] = code
+
+        if PYTHON is False:
+            for path, code in list(codes.items()):
+                errors = _get_errors(index, path, _call(
+                    check, path, code, pylint_cache_size=pylint_cache_size,
+                    **params))
+                del codes[path]
+                yield path, errors
+            return
+
+        size = parallel or os.cpu_count() or 1
+        pool = get_pool(size, 'project')
+        try:
+            for path, code in codes.items():
+                futures[pool.submit(
+                    check, path, code, pylint_cache_size=pylint_cache_size,
+                    **params)] = path
+        except BrokenProcessPool:
+            pass  # the files left are checked one by one below
+
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                errors = _get_errors(index, path, future)
+            except BrokenProcessPool:
+                continue
+            del codes[path]
+            yield path, errors
+
+        # A process of the pool has crashed: check the files left one by one
+        # to find the files crashing it.
+        if codes:
+            reset_pool('project')
+        for path, code in list(codes.items()):
+            future = get_pool(size, 'project').submit(
+                check, path, code, pylint_cache_size=pylint_cache_size,
+                **params)
+            futures = {future: path}
+            try:
+                errors = _get_errors(index, path, future)
+            except BrokenProcessPool:
+                reset_pool('project')
+                errors = [_file_error(path, 'Checker process crashed')]
+            del codes[path]
+            yield path, errors
+
+    finally:
+        for future in futures:
+            future.cancel()
+        index.save()
+        # Don't keep the processes of a one-off check
+        reset_pool('project')
+
+
+def _get_errors(index, path, future):
+    """Get errors of the file checked in the pool and keep them in the index.
+
+    A file which can't be checked gets a single error with the reason. The
+    error isn't kept in the index, so the file is checked again by the next
+    run.
+
+    :return list:
+
+    """
+    try:
+        errors = future.result() or []
+    except BrokenProcessPool:
+        raise
+    except Exception as e:  # noqa
+        return [_file_error(path, e)]
+
+    for err in errors:
+        err['filename'] = path
+    index.update(path, errors)
+    return errors
+
+
+def _call(func, *args, **kwargs):
+    """Call the function in this process.
+
+    :return Future: The done future with its result
+
+    """
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:  # noqa
+        future.set_exception(e)
+    return future
+
+
+def _file_error(path, reason):
+    """Make an error of a file which can't be checked.
+
+    :return dict: The error in the format of pylama errors
+
+    """
+    return dict(
+        filename=path, lnum=1, col=1, type='E', number='E0',
+        linter='pylama', text='E0 %s' % reason)
+
+
+def handle(request):
+    """Process a worker request.
+
+    :return dict: A response
+
+    """
+    response = dict(id=request.get('id'), bufnr=request.get('bufnr'))
+    method = request.get('method')
+
+    if method == 'check':
+        timings = dict()
+        errors = check(timings=timings, **dict(
+            (name, request[name]) for name in CHECK_PARAMS
+            if name in request))
+        response['timings'] = timings
+        if errors is None:
+            response['skip'] = True
+        else:
+            for err in errors:
+                err['bufnr'] = request.get('bufnr')
+            response['errors'] = errors
+        response['cache'] = CACHE.stats()
+
+    elif method == 'flush':
+        flush()
+
+    else:
+        response['error'] = 'Unknown method: %s' % method
+
+    return response
+
+
+PROJECT_PARAMS = (
+    'rootdir', 'linters', 'ignore', 'select', 'linters_params', 'sort',
+    'parallel', 'index_folder', 'pylint_cache_size')
+
+
+def handle_project(request):
+    """Process a project checking request.
+
+    :return generator: A response for every file and the final one
+
+    """
+    files = 0
+    for path, errors in check_project(**dict(
+            (name, request[name]) for name in PROJECT_PARAMS
+            if name in request)):
+        files += 1
+        yield dict(
+            id=request.get('id'), method='project', path=path, errors=errors)
+
+    yield dict(id=request.get('id'), method='project', done=True, files=files)
+
+
+def respond(request):
+    """Process a request.
+
+    :return generator: Responses
+
+    """
+    if 'error' in request:
+        yield dict(id=None, bufnr=None, error=request['error'])
+        return
+
+    for path in request.get('paths', []):
+        if path not in sys.path:
+            sys.path.append(path)
+
+    try:
+        if request.get('method') == 'project':
+            for response in handle_project(request):
+                yield response
+        else:
+            yield handle(request)
+
+    except Exception as e:  # noqa
+        yield dict(
+            id=request.get('id'), bufnr=request.get('bufnr'),
+            method=request.get('method'), error=str(e))
+
+
+def drop_stale(requests):
+    """Keep only the latest check request for every buffer.
+
+    Only the latest project checking request is kept as well.
+
+    :return list:
+
+    """
+    def _key(request):
+        if request.get('method') == 'project':
+            return 'project'
+        return request.get('bufnr')
+
+    latest = dict()
+    for request in requests:
+        if request.get('method') in ('check', 'project'):
+            latest[_key(request)] = request
+
+    return [
+        request for request in requests
+        if request.get('method') not in ('check', 'project') or
+        latest.get(_key(request)) is request
+    ]
+
+
+class ProjectThread(threading.Thread):
+
+    """Check the project in background and write the responses.
+
+    Buffer checks are answered meanwhile by :func:`serve`.
+
+    """
+
+    def __init__(self, request, write):
+        """Init the thread."""
+        super(ProjectThread, self).__init__(daemon=True)
+        self.request = request
+        self.write = write
+        self.stopped = threading.Event()
+
+    def run(self):
+        """Write responses until the check is done or stopped."""
+        responses = respond(self.request)
+        try:
+            for response in responses:
+                if self.stopped.is_set():
+                    break
+                self.write(response)
+        finally:
+            responses.close()
+
+    def stop(self):
+        """Stop the check after the file being checked."""
+        self.stopped.set()
+        self.join()
+
+
+def serve(infile=None, outfile=None):
+    """Answer requests until stdin is closed.
+
+    Projects are checked in a :class:`ProjectThread`. A new project request
+    or a flush request stops the running one.
+
+    """
+    infile = infile or sys.stdin
+    outfile = outfile or sys.stdout
+
+    # Checkers may print: keep stdout for the protocol only.
+    sys.stdout = sys.stderr
+
+    requests = Queue()
+    lock = threading.Lock()
+    project = None
+
+    def _read():
+        try:
+            for line in infile:
+                if not line.strip():
+                    continue
+                try:
+                    requests.put(json.loads(line))
+                except ValueError as e:
+                    requests.put(dict(error='Invalid request: %s' % e))
+        finally:
+            requests.put(None)
+
+    def _write(response):
+        with lock:
+            outfile.write(json.dumps(response) + '\n')
+            outfile.flush()
+
+    threading.Thread(target=_read, daemon=True).start()
+
+    while True:
+        pending = [requests.get()]
+        while not requests.empty():
+            pending.append(requests.get())
+
+        for request in drop_stale([r for r in pending if r is not None]):
+            method = request.get('method')
+            if project is not None and method in ('project', 'flush'):
+                project.stop()
+                project = None
+
+            if method == 'project':
+                project = ProjectThread(request, _write)
+                project.start()
+                continue
+
+            for response in respond(request):
+                _write(response)
+
+        if None in pending:
+            if project is not None:
+                project.join()
+            return
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,136 @@
+"""Outline of a source: spans of class and def statements.
+
+The outline is made from tokens, so ``def`` in strings and brackets is not
+a definition. A source with errors (e.g. not closed brackets while the code
+is edited) is scanned again from the next line at column 0 after an error.
+
+"""
+
+import tokenize
+from io import StringIO
+
+from .environment import env
+
+
+def get_outline():
+    """Set the outline of the current buffer to `l:entries`.
+
+    pymode: uses it in pymode#outline()
+
+    """
+    env.let('l:entries', outline(env.curbuf[:]))
+
+
+def outline(lines):
+    """Find class and def statements with their decorators and bodies.
+
+    :return list: [{kind, name, first, line, body, end, parent}] sorted by
+        lines: `first` is the line of the first decorator, `body` is the
+        first line after the header (the header line for one liners), `end`
+        is the last line of the body and `parent` is the index of the
+        enclosing definition (-1 for top level definitions)
+
+    """
+    entries = []
+    start = 0
+    while start < len(lines):
+        error = _scan(lines, start, entries)
+        if error is None:
+            break
+
+        # Skip to a statement at column 0
+        start = error + 1
+        while start < len(lines) and (
+                not lines[start] or lines[start][0] in ' \t#'):
+            start += 1
+    return entries
+
+
+def _scan(lines, start, entries):
+    """Add definitions of the lines from `start` to `entries`.
+
+    :return int|None: Line of an error (from 0)
+
+    """
+    source = StringIO('\n'.join(lines[start:]) + '\n')
+    stack = []  # [(entry index, depth)]
+    depth = 0
+    decorator = None  # the first line of decorators
+    statement = None  # the first line of the current logical line
+    header = None  # a definition waiting for the end of its header
+    last = start  # the last line of the last logical line
+
+    try:
+        tokens = tokenize.generate_tokens(source.readline)
+        for tok in tokens:
+            row = tok.start[0] + start
+            if tok.type == tokenize.INDENT:
+                depth += 1
+                if header is not None:
+                    stack.append((header, depth))
+                    header = None
+
+            elif tok.type == tokenize.DEDENT:
+                depth -= 1
+                while stack and stack[-1][1] > depth:
+                    entries[stack.pop()[0]]['end'] = last
+
+            elif tok.type == tokenize.NEWLINE:
+                last = row
+                if header is not None:
+                    entries[header]['body'] = row + 1
+                statement = None
+
+            elif tok.type in (tokenize.NL, tokenize.COMMENT):
+                pass
+
+            elif statement is None:
+                statement = row
+                if header is not None:
+                    # One liner (def f(): pass): no indented block follows
+                    entries[header]['body'] = entries[header]['line']
+                    entries[header]['end'] = last
+                    header = None
+
+                if tok.type == tokenize.OP and tok.string == '@':
+                    decorator = row if decorator is None else decorator
+
+                elif tok.type == tokenize.NAME and tok.string in (
+                        'def', 'class', 'async'):
+                    kind = tok
+                    if kind.string == 'async':
+                        kind = next(tokens, kind)
+                    name = next(tokens, kind) if kind.string in (
+                        'def', 'class') else kind
+                    if name.type == tokenize.NAME and name is not kind:
+                        header = len(entries)
+                        entries.append(dict(
+                            kind=kind.string, name=name.string,
+                            first=row if decorator is None else decorator,
+                            line=row, body=None, end=row,
+                            parent=stack[-1][0] if stack else -1))
+                    decorator = None
+
+                else:
+                    decorator = None
+
+    except (tokenize.TokenError, SyntaxError) as exc:
+        error = statement
+        if error is None:
+            pos = getattr(exc, 'lineno', None) or exc.args[1][0]
+            error = pos + start
+        # The statement with the error ends open definitions
+        _end(entries, header, stack, max(last, error))
+        return error - 1
+
+    _end(entries, header, stack, last)
+    return None
+
+
+def _end(entries, header, stack, last):
+    """Set ends of definitions which are not closed by dedents."""
+    if header is not None:
+        entries[header]['body'] = entries[header]['line']
+        entries[header]['end'] = last
+    for index, _ in stack:
+        entries[index]['end'] = last
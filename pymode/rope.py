@@ -1,37 +1,120 @@
 """Integration with Rope library."""
 
+import ast
+import bisect
+import hashlib
+import heapq
 import os.path
+import pickle
 import re
 import site
 import sys
-
-from rope.base import project, libutils, exceptions, change, worder, pycore, codeanalyze
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from rope.base import (
+    project, libutils, exceptions, change, worder, pycore, codeanalyze,
+    evaluate)
+from rope.base.project import _DataFiles # noqa
 from rope.base.fscommands import FileSystemCommands # noqa
 from rope.base.taskhandle import TaskHandle # noqa
 from rope.contrib import autoimport as rope_autoimport, codeassist, findit, generate # noqa
-from rope.refactor import ModuleToPackage, ImportOrganizer, rename, extract, inline, usefunction, move, change_signature, importutils # noqa
+from rope.refactor import ModuleToPackage, ImportOrganizer, rename, extract, inline, usefunction, move, change_signature, importutils, occurrences # noqa
 
+from . import symbols
 from .environment import env
+from .utils import FILES, Task, Worker, WORKER
+from .watcher import watch
+
+
+# Rope is not thread safe: the lock is held while a project is used
+ROPE_LOCK = threading.RLock()
+
+# Updates autoimport caches and symbol indexes (apart from completions)
+INDEX_WORKER = Worker()
+
+# Max number of autoimport proposals
+AUTOIMPORT_LIMIT = 100
+
+# Files checked by rope between updates of found occurrences
+FIND_BATCH = 16
+
+# Max number of buffers mapped to their projects
+RESOURCES_LIMIT = 1000
+
+# Approximate memory used by rope per byte of a parsed module source and per
+# autoimport name
+MODULE_MEMORY = 40
+NAME_MEMORY = 150
+
+IMPORT_RE = re.compile(
+    r'^[ \t]*(?:from[ \t]+([\w.]+)[ \t]+import|import[ \t]+([\w., \t]+))',
+    re.M)
+
+
+# Project markers found in folders: {(folder, markers): (mtime, set)}
+ROOT_MARKERS = dict()
+
 
+def look_ropeproject(path, markers=('.ropeproject',)):
+    """Search for a project root in current and parent dirs.
 
-def look_ropeproject(path):
-    """Search for ropeproject in current and parent dirs.
+    Markers go by priority: the nearest folder with the first marker is
+    taken, when there is none the nearest one with the second and so on.
+    Markers of folders are cached while the folders are unchanged (see
+    :func:`forget_roots`).
 
-    :return str|None: A finded path
+    :return str: A found path (the given one when nothing is found)
 
     """
-    env.debug('Look project', path)
+    folders = []
     p = os.path.abspath(path)
+    while not folders or folders[-1] != p:
+        folders.append(p)
+        p = os.path.dirname(p)
 
-    while True:
-        if '.ropeproject' in os.listdir(p):
-            return p
+    markers = tuple(markers)
+    found = [_root_markers(folder, markers) for folder in folders]
+    for marker in markers:
+        root = next((
+            folder for folder, names in zip(folders, found)
+            if marker in names), None)
+        if root is not None:
+            return root
 
-        new_p = os.path.abspath(os.path.join(p, ".."))
-        if new_p == p:
-            return path
+    return path
 
-        p = new_p
+
+def _root_markers(folder, markers):
+    """Find the markers in the folder.
+
+    Adding or removing a marker changes the folder modification time, so
+    cached results are checked against it.
+
+    :return set:
+
+    """
+    key = folder, markers
+    try:
+        mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    cached = ROOT_MARKERS.get(key)
+    if cached is None or cached[0] != mtime:
+        env.debug('Look project markers', folder, markers)
+        try:
+            names = set(os.listdir(folder)) & set(markers)
+        except OSError:
+            names = set()
+        cached = ROOT_MARKERS[key] = mtime, names
+    return cached[1]
+
+
+def forget_roots():
+    """Drop cached project markers (when a project is created)."""
+    ROOT_MARKERS.clear()
 
 
 @env.catch_exceptions
@@ -57,6 +140,173 @@ def completions():
     return env.stop(proposals)
 
 
+SCOPE_RE = re.compile(r'\s*(async\s+def|def|class)\s')
+
+
+class ProposalCache(object):
+
+    """ Recent completion proposals.
+
+    Proposals are kept for a scope of a buffer and an expression (without
+    the name being typed) and filtered by the name prefix as more characters
+    are typed. An entry is valid while the buffer is changed only by typing
+    the name (checked with b:changedtick).
+
+    Docs of the proposals are fetched when they are asked for.
+
+    """
+
+    def __init__(self, maxsize=100):
+        """ Init the cache. """
+        self.maxsize = maxsize
+        self.current = None
+        self._data = OrderedDict()
+
+    @staticmethod
+    def key(source, offset, row, **params):
+        """ Get a key for the completion.
+
+        :return tuple: (key, prefix of the name being typed)
+
+        """
+        start = codeassist.starting_offset(source, offset)
+        expression = codeassist.starting_expression(source, offset)
+        expression = expression[:len(expression) - (offset - start)]
+        key = (env.curbuf.name, _scope(row), expression) + tuple(
+            sorted(params.items()))
+        return key, source[start:offset]
+
+    def get(self, key, prefix, tick=None):
+        """ Get proposals starting with the prefix.
+
+        Without `tick` entries are taken even when the buffer is changed.
+
+        :return list|None:
+
+        """
+        entry = self._data.get(key)
+        if entry is None or not prefix.startswith(entry['prefix']):
+            return None
+
+        # Autoimport names of a longer prefix may be missed by the entry
+        if entry['partial'] and prefix != entry['prefix']:
+            return None
+
+        typed = len(prefix) - len(entry['prefix'])
+        if tick is not None and not 0 <= int(tick) - entry['tick'] <= typed:
+            return None
+
+        self._data.move_to_end(key)
+        self.current = entry
+        return [p for p in entry['items'] if p['word'].startswith(prefix)]
+
+    def set(self, key, prefix, tick, items, objects, partial=False,
+            current=True):
+        """ Keep proposals (and rope objects to get their docs).
+
+        With `partial` the proposals are cut (autoimport names of a short
+        prefix), so they are used for the same prefix only. With `current`
+        the proposals are the shown ones (for the docs).
+
+        """
+        self._data[key] = dict(
+            prefix=prefix, tick=int(tick), items=items, objects=objects,
+            partial=partial)
+        if current:
+            self.current = self._data[key]
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def doc(self, word):
+        """ Get docs of a proposal returned the last time.
+
+        :return str:
+
+        """
+        if self.current is None:
+            return ''
+
+        proposal = self.current['objects'].get(word)
+        if proposal is None or isinstance(proposal, str):
+            return proposal or ''
+
+        # Don't block Vim when rope is busy with background completion
+        if not ROPE_LOCK.acquire(timeout=0.2):
+            return ''
+        try:
+            doc = proposal.get_doc() or ''
+        except Exception:  # noqa
+            doc = ''
+        finally:
+            ROPE_LOCK.release()
+
+        self.current['objects'][word] = doc
+        return doc
+
+
+PROPOSALS = ProposalCache()
+
+
+def _scope(row):
+    """ Find the header of the function or class the row belongs to.
+
+    :return str: The stripped header line or '' for module scope
+
+    """
+    snapshot = env.snapshot()
+    if not 0 < row < len(snapshot.starts):
+        return ''
+
+    line = snapshot.line(row)
+    indent = len(line) - len(line.lstrip())
+    for num in range(row - 1, 0, -1):
+        line = snapshot.line(num)
+        stripped = line.lstrip()
+        if not stripped or stripped.startswith('#'):
+            continue
+
+        level = len(line) - len(stripped)
+        if level < indent:
+            if SCOPE_RE.match(line):
+                return line.strip()
+            indent = level
+
+        if not indent:
+            break
+
+    return ''
+
+
+def _eager_docs():
+    """ Check docs should be fetched with the proposals.
+
+    They are needed for the preview window only: Vim with the info popup gets
+    them for the selected item (see :func:`complete_doc`).
+
+    :return bool:
+
+    """
+    completeopt, lazy = env.var_list(
+        '&completeopt',
+        "exists('##CompleteChanged') && exists('*popup_findinfo')")
+    if lazy == '1' and 'popup' in completeopt:
+        return False
+    return 'preview' in completeopt
+
+
+@env.catch_exceptions
+def complete_doc():
+    """ Show docs of the selected completion item.
+
+    pymode: uses it in pymode#rope#complete_doc() (CompleteChanged)
+
+    """
+    word = env.var('get(v:event.completed_item, "word", "")')
+    if word:
+        env.let('l:doc', PROPOSALS.doc(word))
+
+
 FROM_RE = re.compile(r'^\s*from\s+[\.\w\d_]+$')
 
 
@@ -105,52 +355,279 @@ def get_proporsals(source, offset, base='', dot=False):
     :return str:
 
     """
+    docs = _eager_docs()
+    key, prefix = PROPOSALS.key(
+        source, offset, env.cursor[0], dot=dot, docs=docs)
+    tick = env.var('b:changedtick')
+    _store_late()
+    proposals = PROPOSALS.get(key, prefix, tick)
+    if proposals is not None:
+        env.debug('Cached proposals', len(proposals))
+        return proposals
+
     with RopeContext() as ctx:  # noqa
+        proposals, objects, partial = _code_assist(
+            ctx, ctx.resource, source, offset, dot=dot, docs=docs)
 
-        try:
-            proposals = codeassist.code_assist(
-                ctx.project, source, offset, ctx.resource, maxfixes=3,
-                later_locals=False)
+    PROPOSALS.set(key, prefix, tick, proposals, objects, partial)
+    return proposals
+
+
+def _code_assist(ctx, resource, source, offset, dot=False, docs=False):
+    """ Get completion proposals (without Vim, so it runs in background).
+
+    :return tuple: (proposals, {name: rope proposal}, partial)
+
+    """
+    try:
+        proposals = codeassist.code_assist(
+            ctx.project, source, offset, resource, maxfixes=3,
+            later_locals=False)
+
+    except exceptions.ModuleSyntaxError:
+        proposals = []
+
+    proposals = sorted(proposals, key=_sort_proporsals)
+
+    out = []
+    for p in proposals:
+        out.append(dict(
+            word=p.name,
+            menu=p.type,
+            kind=p.scope + ':',
+            # Vim makes the info popup for items with info only: the docs
+            # are put into it by complete_doc()
+            info=(p.get_doc() or "No docs.") if docs else " ",
+        ))
+
+    out, partial = _get_autoimport_proposals(
+        out, ctx, source, offset, dot=dot)
+    return out, dict((p.name, p) for p in reversed(proposals)), partial
+
+
+def _code_assist_background(ctx, path, source, offset, dot=False,
+                            docs=False):
+    with ROPE_LOCK:
+        ctx.validate()
+        return _code_assist(
+            ctx, ctx.get_resource(path), source, offset, dot=dot, docs=docs)
+
+
+# Background completion waiting for its results
+COMPLETION = None
+
+# Background completions missed their deadline: results go to the cache
+LATE = []
+
+
+def _store_late():
+    """ Keep results of the late completions finished in background. """
+    for task in LATE[:]:
+        if task.done.is_set():
+            LATE.remove(task)
+            if task.result is not None:
+                context = task.context
+                PROPOSALS.set(
+                    context['key'], context['prefix'],
+                    context['position'][1], *task.result, current=False)
+
+
+@env.catch_exceptions
+def complete_async(dot=False):
+    """ Start code assist in background.
+
+    Results are shown by :func:`complete_poll`.
+
+    pymode: sets l:started in pymode#rope#complete_async()
+
+    """
+    global COMPLETION  # noqa
+
+    row, col = env.cursor
+    cline = env.current.line[:col]
+    if FROM_RE.match(cline) or cline.endswith('..') or cline.endswith('\.'):  # noqa
+        return None
+
+    source, offset = env.get_offset_params()
+    docs = _eager_docs()
+    key, prefix = PROPOSALS.key(source, offset, row, dot=dot, docs=docs)
+    tick = env.var('b:changedtick')
+    startcol = col - len(prefix) + 1
+
+    if COMPLETION is not None:
+        COMPLETION.cancel()
+        COMPLETION = None
+
+    _store_late()
+    proposals = PROPOSALS.get(key, prefix, tick)
+    if proposals is not None:
+        if proposals:
+            env.run('complete', startcol, proposals)
+        return None
+
+    COMPLETION = WORKER.submit(Task(
+        'completion', _code_assist_background, RopeContext(),
+        env.curbuf.name, source, offset, dot=dot, docs=docs))
+    COMPLETION.context.update(
+        position=[env.curbuf.number, tick, row, col],
+        startcol=startcol,
+        key=key,
+        prefix=prefix,
+        deadline=time.time() + int(
+            env.var('g:pymode_rope_completion_deadline')) / 1000.0,
+    )
+    env.let('l:started', 1)
+
+
+@env.catch_exceptions
+def complete_poll():
+    """ Show results of the background code assist.
 
-        except exceptions.ModuleSyntaxError:
-            proposals = []
+    The request is cancelled when the cursor is moved or the buffer is
+    changed. After the deadline recent proposals for the same expression
+    are shown (when there are any).
 
-        proposals = sorted(proposals, key=_sort_proporsals)
+    pymode: uses it from a timer, sets l:waiting while results are awaited
 
-        out = []
-        preview = 'preview' in ctx.options.get('completeopt')
-        for p in proposals:
-            out.append(dict(
-                word=p.name,
-                menu=p.type,
-                kind=p.scope + ':',
-                info=p.get_doc() or "No docs." if preview else "",
-            ))
+    """
+    global COMPLETION  # noqa
+
+    _store_late()
+    task = COMPLETION
+    if task is None:
+        return None
+
+    bufnr, tick, row, col, mode = env.var_list(
+        'bufnr("%")', 'b:changedtick', 'line(".")', 'col(".") - 1', 'mode()')
+    if mode != 'i' or task.context['position'] != [
+            int(bufnr), tick, int(row), int(col)]:
+        env.debug('Completion is cancelled')
+        task.cancel()
+        COMPLETION = None
+        return None
+
+    context = task.context
+    if task.done.is_set():
+        COMPLETION = None
+        if task.error is not None:
+            return env.error(task.error)
+        proposals, objects, partial = task.result
+        PROPOSALS.set(
+            context['key'], context['prefix'], context['position'][1],
+            proposals, objects, partial)
+
+    elif time.time() > context['deadline'] and PROPOSALS.get(
+            context['key'], context['prefix']) is not None:
+        # Show recent proposals, the task refreshes them for the next time.
+        COMPLETION = None
+        LATE.append(task)
+        proposals = PROPOSALS.get(context['key'], context['prefix'])
+        env.debug('Completion deadline, recent proposals', len(proposals))
 
-        out = _get_autoimport_proposals(out, ctx, source, offset, dot=dot)
+    else:
+        return env.let('l:waiting', 1)
 
-    return out
+    if proposals:
+        env.run('complete', task.context['startcol'], proposals)
+    return None
 
 
 @env.catch_exceptions
 def goto():
-    """ Goto definition. """
+    """ Goto definition.
+
+    Module level names defined or imported in the current module are found
+    in the symbols index (when it's unambiguous), rope inference is used
+    otherwise.
+
+    """
     with RopeContext() as ctx:
         source, offset = env.get_offset_params()
 
-        found_resource, line = codeassist.get_definition_location(
-            ctx.project, source, offset, ctx.resource, maxfixes=3)
+        found = _goto_symbol(ctx, source)
+        if found is None:
+            try:
+                found_resource, line = codeassist.get_definition_location(
+                    ctx.project, source, offset, ctx.resource, maxfixes=3)
+            except exceptions.RopeError as e:
+                env.debug('Definition is not inferred', e)
+                found_resource = None
 
-        if not found_resource:
-            env.error('Definition not found')
-            return
+            if not found_resource:
+                env.error('Definition not found')
+                return
+
+            found = found_resource.real_path, line
 
-        env.goto_file(
-            found_resource.real_path,
-            cmd=ctx.options.get('goto_definition_cmd'))
+        path, line = found
+        env.goto_file(path, cmd=ctx.options.get('goto_definition_cmd'))
         env.goto_line(line)
 
 
+def _goto_symbol(ctx, source):
+    """ Find the definition of the name under cursor without inference.
+
+    Works for names defined on the module level of the current module and
+    names imported with ``from ... import``. Names bound in the scopes
+    around the cursor are left to rope.
+
+    :return tuple|None: (path, line)
+
+    """
+    if ctx.symbols is None or not env.curbuf.name:
+        return None
+
+    row, col = env.cursor
+    line = env.current.line
+    start = end = col
+    while start > 0 and (line[start - 1].isalnum() or line[start - 1] == '_'):
+        start -= 1
+    while end < len(line) and (line[end].isalnum() or line[end] == '_'):
+        end += 1
+    name = line[start:end]
+    if not name or name[0].isdigit() or line[:start].rstrip().endswith('.'):
+        return None
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    if symbols.is_local(tree, name, row, len(line[:start].encode('utf-8'))):
+        return None
+
+    lines = [
+        lnum for n, _, lnum, parent in symbols.scan(tree)
+        if n == name and parent is None]
+    if lines:
+        return (env.curbuf.name, lines[0]) if len(lines) == 1 else None
+
+    for node in tree.body:
+        if not isinstance(node, ast.ImportFrom):
+            continue
+        for alias in node.names:
+            if (alias.asname or alias.name) != name:
+                continue
+            modpath = os.path.join(*(node.module or '').split('.'))
+            if node.level:
+                folder = os.path.dirname(os.path.realpath(env.curbuf.name))
+                for _ in range(node.level - 1):
+                    folder = os.path.dirname(folder)
+                paths = [os.path.join(folder, modpath)]
+            else:
+                paths = [os.path.join(f.real_path, modpath)
+                         for f in ctx.project.get_source_folders()]
+            paths = set(os.path.normpath(p) + suffix for p in paths
+                        for suffix in ('.py', os.sep + '__init__.py'))
+            found = [
+                (path, lnum) for path, lnum, _, parent in
+                ctx.symbols.lookup(alias.name)
+                if parent is None and path in paths]
+            return found[0] if len(found) == 1 else None
+
+    return None
+
+
 @env.catch_exceptions
 def show_doc():
     """ Show documentation. """
@@ -167,24 +644,70 @@ def show_doc():
 
 
 def find_it():
-    """ Find occurrences. """
+    """ Find occurrences.
+
+    The name under cursor is resolved once. Files without the name are
+    skipped, rope checks the others one by one. Occurrences are added to the
+    location list after every `FIND_BATCH` checked files.
+
+    """
     with RopeContext() as ctx:
         _, offset = env.get_offset_params()
         try:
-            occurrences = findit.find_occurrences(
-                ctx.project, ctx.resource, offset)
+            name = worder.get_name_at(ctx.resource, offset)
+            pymodule = ctx.project.get_pymodule(ctx.resource)
+            primary, pyname = evaluate.eval_location2(pymodule, offset)
         except exceptions.BadIdentifierError:
-            occurrences = []
+            return
+
+        finder = occurrences.create_finder(
+            ctx.project, name, pyname, instance=primary)
+        found = []
+        for checked, resource in enumerate(_find_candidates(ctx, name), 1):
+            found.extend(
+                findit.Location(oc) for oc in finder.find_occurrences(
+                    resource=resource))
+            if checked % FIND_BATCH == 0:
+                _add_occurrences(found)
+                found = []
+        _add_occurrences(found)
+
+
+def _find_candidates(ctx, name):
+    """ Find project files which contain the name (the current one first).
+
+    :return iterator: Resources
+
+    """
+    pattern = re.compile(
+        br'\b' + re.escape(name.encode('utf-8')) + br'\b')
+
+    yield ctx.resource
+    for resource in ctx.project.get_python_files():
+        if resource == ctx.resource:
+            continue
+        data = FILES.read(resource.real_path)
+        if data is not None and pattern.search(data) is not None:
+            yield resource
+
+
+def _add_occurrences(locations):
+    if not locations:
+        return
 
     lst = []
-    for oc in occurrences:
+    for oc in locations:
+        if oc.resource.real_path == env.curbuf.name:
+            lines = env.lines
+        else:
+            lines = FILES.lines(oc.resource.real_path)
         lst.append(dict(
             filename=oc.resource.path,
-            text=env.lines[oc.lineno - 1] if oc.resource.real_path == env.curbuf.name else "", # noqa
+            text=lines[oc.lineno - 1] if oc.lineno <= len(lines) else "",
             lnum=oc.lineno,
             type=''
         ))
-    env.run('g:PymodeLocList.current().extend', lst)
+    env.run('pymode#rope#find_it_add', lst)
 
 
 def update_python_path(paths):
@@ -212,6 +735,7 @@ def organize_imports():
         if changes is not None:
             progress = ProgressHandler('Organize imports')
             ctx.project.do(changes, task_handle=progress.handle)
+            ctx.dirty = True
             reload_changes(changes)
 
 
@@ -220,10 +744,118 @@ def regenerate():
     """ Clear cache. """
     with RopeContext() as ctx:
         ctx.project.pycore._invalidate_resource_cache(ctx.resource) # noqa
-        ctx.importer.generate_cache()
+        if ctx.autoimport is not None:
+            ctx.generate_autoimport_cache()
         ctx.project.sync()
 
 
+def sync(wait=True):
+    """ Write data of the changed rope projects.
+
+    pymode: uses it on idle (CursorHold) and BufWritePost
+
+    """
+    if not ROPE_LOCK.acquire(blocking=wait):
+        return
+    try:
+        for ctx in list(RopeContext.projects.values()):
+            if ctx is not None and ctx.dirty:
+                env.debug('Sync rope project', ctx.project.address)
+                ctx.project.sync()
+                ctx.dirty = False
+    finally:
+        ROPE_LOCK.release()
+
+
+def close():
+    """ Close the cached rope projects (their data is written).
+
+    pymode: uses it on VimLeavePre
+
+    """
+    RopeContext.close_all()
+
+
+def stats():
+    """ Show cached projects, the most recently used first.
+
+    pymode: uses it in command PymodeRopeStats, sets l:output
+
+    """
+    output = []
+    total = 0
+    with ROPE_LOCK:
+        projects = list(RopeContext.projects.items())
+        output.append('Rope projects: %d' % len(projects))
+        for key, ctx in reversed(projects):
+            if ctx is None:
+                continue
+            size = ctx.memory()
+            total += size
+            modules = len(ctx.project.pycore.module_cache.module_map)
+            names = sum(len(n) for n in ctx.importer.names.values())
+            output.append(
+                '%8.1f MB  %5d modules  %7d autoimport names  %s' % (
+                    size / 1024.0 / 1024, modules, names, key))
+    output.append('%8.1f MB  total (approximately)' % (total / 1024.0 / 1024))
+    env.let('l:output', output)
+
+
+@env.catch_exceptions
+def symbol():
+    """ Find project definitions by name (fuzzy).
+
+    Goes to the definition when only one is found, lists them in the
+    location list otherwise.
+
+    pymode: uses it in command PymodeSymbol with pymode#rope#symbol()
+
+    """
+    query = env.var('a:query')
+    ctx = RopeContext()
+    if ctx.symbols is None:
+        return env.error('Symbols index is disabled (g:pymode_rope_symbols).')
+
+    found = ctx.symbols.search(query)
+    if not found:
+        return env.message('Symbol not found: %s' % query)
+
+    if len(found) == 1:
+        path, line, _, _ = found[0]
+        env.goto_file(path, cmd=ctx.options.get('goto_definition_cmd'))
+        return env.goto_line(line)
+
+    env.run('g:PymodeLocList.current().extend', [dict(
+        filename=path, lnum=line, text='%s %s' % (kind, qualified), type='')
+        for path, line, kind, qualified in found])
+
+
+def update_symbols():
+    """ Update definitions of the written file in the symbols index.
+
+    pymode: uses it on BufWritePost
+
+    """
+    ctx = RopeContext()
+    if ctx is None or ctx.symbols is None:
+        return
+
+    with ROPE_LOCK:
+        resource = ctx.get_resource(env.curbuf.name)
+        if resource is None or resource.project is not ctx.project or \
+                not ctx.project.pycore.is_python_file(resource):
+            return
+        if ctx.symbols.update(resource.real_path):
+            ctx.dirty = True
+
+
+def validate():
+    """ Check all files of the project for changes made outside of rope. """
+    with RopeContext() as ctx:
+        ctx.validate(full=True)
+        env.message('Rope project is validated: %s' % ctx.project.address)
+
+
 def new():
     """ Create a new project. """
     root = None
@@ -239,6 +871,7 @@ def new():
     ropefolder = env.var('g:pymode_rope_ropefolder')
     prj = project.Project(projectroot=root, ropefolder=ropefolder)
     prj.close()
+    forget_roots()
     env.message("Project is opened: %s" % root)
 
 
@@ -258,6 +891,7 @@ def undo():
             progress = ProgressHandler('Undo %s' % str(changes))
             for c in ctx.project.history.undo(task_handle=progress.handle):
                 reload_changes(c)
+            ctx.dirty = True
 
 
 def redo():
@@ -276,6 +910,7 @@ def redo():
             progress = ProgressHandler('Redo %s' % str(changes))
             for c in ctx.project.history.redo(task_handle=progress.handle):
                 reload_changes(c)
+            ctx.dirty = True
 
 
 def cache_project(cls):
@@ -284,20 +919,24 @@ def cache_project(cls):
     :return func:
 
     """
-    projects = dict()
-    resources = dict()
+    projects = OrderedDict()
+    resources = OrderedDict()
 
     def get_ctx(*args, **kwargs):
         path = env.curbuf.name
         if resources.get(path):
-            return resources.get(path)
+            ctx = resources[path]
+            resources.move_to_end(path)
+            projects.move_to_end(ctx.project_path)
+            return ctx
 
         project_path = env.var('g:pymode_rope_project_root')
         if not project_path:
             project_path = env.curdir
             env.debug('Look ctx', project_path)
             if env.var('g:pymode_rope_lookup_project', True):
-                project_path = look_ropeproject(project_path)
+                project_path = look_ropeproject(
+                    project_path, env.var('g:pymode_rope_project_markers'))
 
         if not os.path.exists(project_path):
             env.error("Rope project root not exist: %s" % project_path)
@@ -308,9 +947,51 @@ def cache_project(cls):
 
         if not ctx:
             projects[project_path] = ctx = cls(path, project_path)
+            evict(ctx)
+        projects.move_to_end(project_path)
 
         resources[path] = ctx
+        resources.move_to_end(path)
+        while len(resources) > RESOURCES_LIMIT:
+            resources.popitem(last=False)
         return ctx
+
+    def evict(current):
+        """ Close least recently used projects over the limits. """
+        limit, memory = env.var_list(
+            'g:pymode_rope_projects_limit',
+            'g:pymode_rope_projects_memory_limit')
+        limit, memory = max(int(limit), 1), int(memory) * 1024 * 1024
+        sizes = dict(
+            (key, ctx.memory()) for key, ctx in projects.items()
+            if ctx is not None) if memory else dict()
+
+        for key, ctx in list(projects.items()):
+            if len(projects) <= limit and (
+                    not memory or sum(sizes.values()) <= memory):
+                break
+            if ctx is current:
+                continue
+
+            env.debug('Close rope project', key)
+            del projects[key]
+            sizes.pop(key, None)
+            for path in [p for p, c in resources.items() if c is ctx]:
+                del resources[path]
+            if ctx is not None:
+                ctx.close()
+
+    def close_all():
+        """ Close all projects. """
+        for key, ctx in list(projects.items()):
+            del projects[key]
+            if ctx is not None:
+                env.debug('Close rope project', key)
+                ctx.close()
+        resources.clear()
+
+    get_ctx.projects = projects
+    get_ctx.close_all = close_all
     return get_ctx
 
 
@@ -326,11 +1007,16 @@ def autoimport():
         return False
 
     with RopeContext() as ctx:
-        if not ctx.importer.names:
-            ctx.generate_autoimport_cache()
-        modules = ctx.importer.get_modules(word)
+        if ctx.autoimport is None:
+            ctx.autoimport = AutoImportIndex(ctx)
+            ctx.generate_autoimport_cache(background=False)
+        modules = ctx.autoimport.get_modules(word)
         if not modules:
-            env.message('Global name %s not found.' % word)
+            if ctx.autoimport.building:
+                env.message('Global name %s not found (autoimport cache '
+                            'is not ready yet).' % word)
+            else:
+                env.message('Global name %s not found.' % word)
             return False
 
         if len(modules) == 1:
@@ -355,6 +1041,7 @@ class RopeContext(object):
     def __init__(self, path=None, project_path=None):
         """ Init Rope context. """
         self.path = path
+        self.project_path = project_path
 
         self.project = project.Project(project_path, fscommands=FileSystemCommands())
 
@@ -365,6 +1052,7 @@ class RopeContext(object):
 
         self.resource = None
         self.current = None
+        self.dirty = False
         self.options = dict(
             completeopt=env.var('&completeopt'),
             autoimport=env.var('g:pymode_rope_autoimport', True),
@@ -372,63 +1060,533 @@ class RopeContext(object):
             goto_definition_cmd=env.var('g:pymode_rope_goto_definition_cmd'),
         )
 
+        self.watcher = None
+        if env.var('g:pymode_rope_watch', True):
+            self.watcher = watch(self.project.address)
+
         if os.path.exists("%s/__init__.py" % project_path):
             sys.path.append(project_path)
 
+        self.autoimport = None
         if self.options.get('autoimport'):
+            self.autoimport = AutoImportIndex(self)
             self.generate_autoimport_cache()
 
+        self.symbols = self.symbols_handle = None
+        if env.var('g:pymode_rope_symbols', True):
+            self.symbols = symbols.SymbolIndex(
+                self.project.data_files.read_data('pymode_symbols'))
+            self.project.data_files.add_write_hook(self._write_symbols)
+            self.update_symbols()
+
         env.debug('Context init', project_path)
         env.message('Init Rope project: %s' % project_path)
 
     def __enter__(self):
         """ Enter to Rope ctx. """
         env.let('g:pymode_rope_current', self.project.root.real_path)
-        self.project.validate(self.project.root)
-        self.resource = libutils.path_to_resource(
-            self.project, env.curbuf.name, 'file')
+        path = env.curbuf.name
+        ROPE_LOCK.acquire()
+        try:
+            self.validate()
+            self.resource = self.get_resource(path)
+        except BaseException:
+            ROPE_LOCK.release()
+            raise
 
-        if not self.resource.exists() or os.path.isdir(
-                self.resource.real_path):
-            self.resource = None
-        else:
+        if self.resource:
             env.debug('Found resource', self.resource.path)
 
         return self
 
     def __exit__(self, t, value, traceback):
-        """ Exit from Rope ctx. """
-        if t is None:
+        """ Exit from Rope ctx.
+
+        The project is kept open, its data is written by :func:`sync` when
+        it is changed (`dirty`).
+
+        """
+        ROPE_LOCK.release()
+
+    def close(self):
+        """ Stop background jobs, write the project data and close it. """
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.symbols_handle is not None:
+            self.symbols_handle.stop()
+        if self.autoimport is not None and self.autoimport.building:
+            self.autoimport.progress.handle.stop()
+        with ROPE_LOCK:
             self.project.close()
 
-    def generate_autoimport_cache(self):
-        """ Update autoimport cache. """
-        env.message('Regenerate autoimport cache.')
-        modules = self.options.get('autoimport_modules', [])
+    def memory(self):
+        """ Estimate memory used by rope caches of the project.
+
+        :return int: Bytes
+
+        """
+        modules = list(self.project.pycore.module_cache.module_map.values())
+        size = sum(
+            len(getattr(pymodule, 'source_code', None) or '')
+            for pymodule in modules) * MODULE_MEMORY
+        size += sum(
+            len(names) for names in list(self.importer.names.values())
+        ) * NAME_MEMORY
+        return size
+
+    def validate(self, full=False):
+        """ Update rope caches for files changed outside of rope.
+
+        Only the paths changed since the last time are checked when the
+        project is watched, everything is checked otherwise.
+
+        """
+        paths, full = (set(), True) if self.watcher is None or full else \
+            self.watcher.changes()
+        if full:
+            self.dirty = True
+            return self.project.validate(self.project.root)
+
+        self.dirty = self.dirty or bool(paths)
+
+        for path in paths:
+            # Removed files are found from their folders
+            if not os.path.exists(path):
+                path = os.path.dirname(path)
+            kind = 'folder' if os.path.isdir(path) else 'file'
+            try:
+                resource = libutils.path_to_resource(self.project, path, kind)
+            except exceptions.RopeError:
+                continue
+            self.project.validate(resource)
+
+    def get_resource(self, path):
+        """ Get the project resource of a file.
+
+        :return Resource|None: None when the file doesn't exist
+
+        """
+        resource = libutils.path_to_resource(self.project, path, 'file')
+        if not resource.exists() or os.path.isdir(resource.real_path):
+            return None
+        return resource
+
+    def update_symbols(self):
+        """ Scan changed project files for definitions in background. """
+        def _update(handle):
+            with ROPE_LOCK:
+                paths = [f.real_path for f in self.project.get_python_files()]
+            if self.symbols.update_all(paths, handle):
+                self.dirty = True
+
+        if self.symbols_handle is not None:
+            self.symbols_handle.stop()
+        self.symbols_handle = TaskHandle(name='symbols_handle')
+        INDEX_WORKER.submit(Task(
+            'symbols:%s' % self.project.address, _update,
+            self.symbols_handle))
+
+    def _write_symbols(self):
+        self.project.data_files.write_data(
+            'pymode_symbols', self.symbols.data())
+
+    def generate_autoimport_cache(self, background=True):
+        """ Update autoimport cache.
+
+        The cache is updated in background when Vim has timers to show the
+        progress, completions use the part which is ready.
+
+        """
+        if background and env.var("has('timers')", True):
+            self.autoimport.update()
+            env.run('pymode#rope#autoimport_progress')
+        else:
+            self.autoimport.update(background=False)
+
+
+class AutoImportIndex(object):
+
+    """ Keep the autoimport cache of a project up to date.
+
+    Only modules changed since the last time (by modification time and
+    size) are scanned. The stamps are saved with the rope project data, so
+    the cache is ready at once in the next sessions.
+
+    """
+
+    def __init__(self, ctx):
+        """ Init the index. """
+        self.ctx = ctx
+        self.importer = ctx.importer
+        self.project = ctx.project
+        self.modules = ctx.options.get('autoimport_modules') or []
+        self.stamps = self.project.data_files.read_data('pymode_autoimport')
+        if not isinstance(self.stamps, dict):
+            self.stamps = dict()
+        self.popularity = Counter()
+        for key, entry in list(self.stamps.items()):
+            # Rescan modules lost from the cache and entries of older
+            # versions: (stamp, module name, imports) are kept now
+            if not isinstance(entry, (tuple, list)) or len(entry) != 3 or \
+                    entry[1] not in self.importer.names:
+                del self.stamps[key]
+            else:
+                self.popularity.update(entry[2])
+        self.project.data_files.add_write_hook(self._write)
+        # Filled from the rope cache in background
+        self.names = None
+        self.progress = None
+        self.task = None
+        # Debug messages of the background scan, see :meth:`log`
+        self.messages = []
+
+    @property
+    def building(self):
+        """ Check the cache is being updated in background. """
+        return self.task is not None and not self.task.done.is_set()
+
+    def import_assist(self, starting, limit=AUTOIMPORT_LIMIT):
+        """ Find global names starting with the prefix.
+
+        Names of the modules imported in the project more often go first.
+        A short prefix matches too many names: only the first `limit` of
+        them (in alphabetical order) are ranked.
+
+        :return list: [(name, module)]
+
+        """
+        if self.names is None:
+            return []
+        return heapq.nsmallest(
+            limit, self.names.search(starting, limit), key=self._rank)
+
+    def get_modules(self, name):
+        """ Find modules which have the global name.
+
+        :return list:
+
+        """
+        if self.names is None:
+            return []
+        return [module for _, module in sorted(
+            ((name, module) for module in self.names.get(name)),
+            key=self._rank)]
+
+    def _rank(self, item):
+        name, module = item
+        return -self.popularity[module], module.count('.'), name, module
+
+    def update(self, background=True):
+        """ Scan changed modules (a running update is restarted).
+
+        :return Task:
+
+        """
+        if self.building:
+            self.progress.handle.stop()
+
+        self.progress = ProgressHandler(
+            'Generate autoimport cache', background=background)
+        task = Task('autoimport:%s' % self.project.address, self._update,
+                    self.progress.handle)
+        if background:
+            self.task = INDEX_WORKER.submit(task)
+        else:
+            task.run()
+            self.log()
+            if task.error is not None:
+                raise task.error
+        return task
+
+    def log(self):
+        """ Write debug messages of the scan.
+
+        The scan runs in background, Vim is used by the main thread only.
+
+        """
+        while self.messages:
+            env.debug(*self.messages.pop(0))
+
+    def _update(self, handle):
+        with ROPE_LOCK:
+            if self.names is None:
+                self.names = NameIndex()
+                for modname, names in self.importer.names.items():
+                    self.names.update(modname, (), names)
+            modules = list(self._modules())
+        jobset = handle.create_jobset('Autoimport cache', len(modules))
+
+        for key, path, target in modules:
+            jobset.started_job(key)
+            stamp = _stamp(path)
+            old = self.stamps.get(key)
+            if old is None or old[0] != stamp:
+                with ROPE_LOCK:
+                    if old is not None:
+                        self.popularity.subtract(old[2])
+                    modname, imports = self._scan(target)
+                    self.popularity.update(imports)
+                    self.stamps[key] = stamp, modname, imports
+                    self.ctx.dirty = True
+            jobset.finished_job()
+
+        with ROPE_LOCK:
+            keys = set(key for key, _, _ in modules)
+            removed = dict(
+                (key, self.stamps.pop(key)) for key in list(self.stamps)
+                if key not in keys)
+            names = set(modname for _, modname, _ in self.stamps.values())
+            for _, modname, imports in removed.values():
+                self.popularity.subtract(imports)
+                if modname not in names:
+                    self.names.update(
+                        modname, self.importer.names.pop(modname, ()), ())
+                    self.ctx.dirty = True
+
+        return len(modules)
+
+    def _modules(self):
+        """ Find modules to scan.
+
+        :return iterator: (key, path to stamp, resource or module name)
+
+        """
+        seen = set()
+
+        def _module(resource, target):
+            path = resource.real_path
+            if resource.is_folder():
+                path = os.path.join(path, '__init__.py')
+            if path not in seen:
+                seen.add(path)
+                yield path, path, target
+
+        for resource in self.project.get_python_files():
+            for module in _module(resource, resource):
+                yield module
+
+        for modname in self.modules:
+            if modname.endswith('.*'):
+                folder = self.project.find_module(modname[:-2])
+                for resource in _submodules(folder) if folder else []:
+                    for module in _module(resource, resource):
+                        yield module
+                continue
+
+            resource = self.project.find_module(modname)
+            if resource is None:
+                # Builtin (or missing) modules change with Python only
+                yield 'module:%s' % modname, None, modname
+            else:
+                for module in _module(resource, modname):
+                    yield module
+
+    def _scan(self, target):
+        """ Update names of a module (by a resource or a name).
+
+        :return tuple: (module name, modules imported by the module)
+
+        """
+        imports = []
+        if isinstance(target, str):
+            modname = target
+        else:
+            modname = libutils.modname(target)
+            try:
+                # Count imports made in the project only
+                if target.project is self.project and not target.is_folder():
+                    imports = _imports(target.read())
+            except exceptions.RopeError:
+                pass
+
+        old = self.importer.names.get(modname, ())
+        try:
+            if isinstance(target, str):
+                self.importer.update_module(target)
+            else:
+                self.importer.update_resource(target)
+        except exceptions.RopeError as e:
+            self.messages.append(('Autoimport cache error', modname, e))
+        self.names.update(modname, old, self.importer.names.get(modname, ()))
+        return modname, imports
+
+    def _write(self):
+        self.project.data_files.write_data('pymode_autoimport', self.stamps)
+
+
+class NameIndex(object):
+
+    """ Find global names of modules by a prefix (with binary search). """
+
+    def __init__(self):
+        """ Init the index. """
+        self.modules = dict()
+        self.names = []
+        self.added = []
+        self.removed = False
+
+    def update(self, modname, old, new):
+        """ Replace global names of a module. """
+        new = set(new)
+        for name in set(old) - new:
+            modules = self.modules.get(name)
+            if modules is not None:
+                modules.discard(modname)
+                if not modules:
+                    del self.modules[name]
+                    self.removed = True
+
+        for name in new:
+            modules = self.modules.setdefault(name, set())
+            if not modules:
+                self.added.append(name)
+            modules.add(modname)
+
+    def get(self, name):
+        """ Get modules which have the name.
+
+        :return set:
+
+        """
+        return self.modules.get(name, ())
+
+    def search(self, prefix, limit=None):
+        """ Find names starting with the prefix.
+
+        With `limit` only the first names are found.
+
+        :return iterator: (name, module)
+
+        """
+        names = self._sorted()
+        start = bisect.bisect_left(names, prefix)
+        end = bisect.bisect_left(
+            names, prefix + '\U0010ffff', start,
+            len(names) if limit is None else min(len(names), start + limit))
+        for name in names[start:end]:
+            for module in self.modules[name]:
+                yield name, module
+
+    def _sorted(self):
+        if self.added or self.removed:
+            # Sorting is fast when most of the names are in order already
+            names = self.names + self.added
+            names.sort()
+            self.names = [
+                name for n, name in enumerate(names)
+                if name in self.modules and (n == 0 or names[n - 1] != name)]
+            self.added = []
+            self.removed = False
+        return self.names
+
+
+def _imports(source):
+    """ Find modules (and their packages) imported in the source.
+
+    :return list:
+
+    """
+    modules = set()
+    for match in IMPORT_RE.finditer(source):
+        if match.group(1):
+            names = [match.group(1)]
+        else:
+            names = [name.split()[0] for name in match.group(2).split(',')
+                     if name.strip()]
+        for name in names:
+            parts = name.split('.')
+            modules.update(
+                '.'.join(parts[:n]) for n in range(1, len(parts) + 1))
+    return sorted(modules)
+
+
+def _stamp(path):
+    """ Get a stamp to find out a module is changed.
 
-        def _update_cache(importer, modules=None):
-            importer.generate_cache()
-            if modules:
-                importer.generate_modules_cache(modules)
-            importer.project.sync()
+    :return tuple|str|None:
+
+    """
+    if path is None:
+        return sys.version
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _submodules(resource):
+    """ Find modules of a package (as rope autoimport does). """
+    if not resource.is_folder():
+        if resource.name.endswith('.py') and resource.name != '__init__.py':
+            yield resource
+        return
+
+    if not resource.has_child('__init__.py'):
+        return
+
+    yield resource
+    for child in resource.get_children():
+        for module in _submodules(child):
+            yield module
 
-        _update_cache(self.importer, modules)
+
+@env.catch_exceptions
+def autoimport_poll():
+    """ Show the progress of autoimport caches generation.
+
+    pymode: uses it from a timer, sets l:waiting while caches are generated
+
+    """
+    for ctx in list(RopeContext.projects.values()):
+        index = ctx and ctx.autoimport
+        if index is None or index.task is None:
+            continue
+
+        index.log()
+        task = index.task
+        if not task.done.is_set():
+            index.progress.show()
+            env.let('l:waiting', 1)
+            continue
+
+        index.task = None
+        if isinstance(task.error, exceptions.InterruptedTaskError):
+            continue
+        if task.error is not None:
+            env.error('Autoimport cache: %s' % task.error)
+        elif not task.cancelled:
+            env.message('Autoimport cache is ready: %s modules' % task.result)
 
 
 class ProgressHandler(object):
 
     """ Handle task progress. """
 
-    def __init__(self, msg):
-        """ Init progress handler. """
+    def __init__(self, msg, background=False):
+        """ Init progress handler.
+
+        The progress of a task run in background is shown by :meth:`show`.
+
+        """
         self.handle = TaskHandle(name="refactoring_handle")
         self.handle.add_observer(self)
         self.message = msg
+        self.background = background
+        self.percent_done = None
+        self.shown = None
 
     def __call__(self):
         """ Show current progress. """
-        percent_done = self.handle.current_jobset().get_percent_done()
-        env.message('%s - done %s%%' % (self.message, percent_done))
+        self.percent_done = self.handle.current_jobset().get_percent_done()
+        if not self.background:
+            self.show()
+
+    def show(self):
+        """ Show current progress (when it's changed). """
+        if self.shown != self.percent_done:
+            self.shown = self.percent_done
+            env.message('%s - done %s%%' % (self.message, self.percent_done))
 
 
 _scope_weight = {
@@ -440,6 +1598,232 @@ def _sort_proporsals(p):
         _scope_weight.get(p.scope, 100), int(p.name.startswith('_')), p.name)
 
 
+class RefactoringPreview(object):
+
+    """ Show changes of a refactoring file by file, apply the chosen ones.
+
+    Diffs are made when files come into view of the preview buffer (see
+    pymode#rope#preview_open()), so a preview of a large refactoring costs
+    as much as a small one. The changes are not applied when their files are
+    changed while the preview is open.
+
+    """
+
+    # Refactoring waiting for the user in the preview buffer
+    current = None
+
+    def __init__(self, changes):
+        """ Init the preview. """
+        self.changes = changes
+        self.leaves = []
+        self.entries = []
+        entries = dict()
+        for leaf in _leaf_changes(changes):
+            resource = getattr(leaf, 'resource', None)
+            path = resource.path if resource is not None else ''
+            if path not in entries:
+                entries[path] = dict(path=path, apply=True, open=True,
+                                     diff=None, changes=[])
+                self.entries.append(entries[path])
+            entries[path]['changes'].append(leaf)
+            self.leaves.append((leaf, entries[path]))
+
+        self.header = [
+            getattr(changes, 'description', None) or str(changes),
+            'Files: %s. <CR> - show/hide changes, a - apply/skip the file, '
+            'A - apply, q - cancel' % len(self.entries),
+            '']
+        self.stamps = self._stamps(changes)
+
+    @classmethod
+    def open(cls, changes):
+        """ Open the preview buffer. """
+        cls.current = preview = cls(changes)
+        env.run('pymode#rope#preview_open', preview.header + [
+            preview._title(entry) for entry in preview.entries])
+
+    def selected(self):
+        """ Get the changes of the files to apply.
+
+        :return ChangeSet:
+
+        """
+        changes = change.ChangeSet(self.header[0])
+        for leaf, entry in self.leaves:
+            if entry['apply']:
+                changes.add_change(leaf)
+        return changes
+
+    def changed(self, changes):
+        """ Find files of the changes modified since the preview is open.
+
+        :return list: Paths
+
+        """
+        stamps = self._stamps(changes)
+        return sorted(
+            path for path, stamp in stamps.items()
+            if self.stamps.get(path) != stamp)
+
+    @staticmethod
+    def _stamps(changes):
+        """ Get changedticks of loaded buffers and mtimes of the files.
+
+        :return dict: {path: (changedtick or None, mtime or None)}
+
+        """
+        ticks = dict(
+            (os.path.realpath(path), int(tick)) for path, tick in env.var(
+                'map(filter(range(1, bufnr("$")), "bufloaded(v:val)"), '
+                '"[fnamemodify(bufname(v:val), \':p\'), '
+                'getbufvar(v:val, \'changedtick\')]")'))
+
+        stamps = dict()
+        for resource in changes.get_changed_resources():
+            path = resource.real_path
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            stamps[path] = ticks.get(path), mtime
+        return stamps
+
+    def render(self, first, last):
+        """ Make diffs of files coming into view (lines first..last). """
+        buf, row = env.curbuf, env.cursor[0]
+        for line, entry in self._headers():
+            if line > last:
+                break
+            if line >= first and entry['open'] and entry['diff'] is None:
+                entry['diff'] = self._diff(entry)
+                buf[line:line] = entry['diff']
+                if line < row:
+                    row += len(entry['diff'])
+        env.current.window.cursor = row, env.cursor[1]
+
+    def toggle(self):
+        """ Show/hide changes of the file under cursor. """
+        line, entry = self._entry()
+        if entry is None:
+            return
+
+        buf = env.curbuf
+        if entry['open'] and entry['diff'] is not None:
+            del buf[line:line + len(entry['diff'])]
+            entry['open'] = False
+        else:
+            if entry['diff'] is None:
+                entry['diff'] = self._diff(entry)
+            buf[line:line] = entry['diff']
+            entry['open'] = True
+        env.current.window.cursor = line, 0
+
+    def mark(self):
+        """ Apply/skip the file under cursor. """
+        line, entry = self._entry()
+        if entry is not None:
+            entry['apply'] = not entry['apply']
+            env.curbuf[line - 1] = self._title(entry)
+
+    def _headers(self):
+        """ Find header lines of the files (the index is changed on the go).
+
+        :return iterator: (line, entry)
+
+        """
+        line = len(self.header) + 1
+        for entry in self.entries:
+            yield line, entry
+            line += 1
+            if entry['open'] and entry['diff'] is not None:
+                line += len(entry['diff'])
+
+    def _entry(self):
+        row = env.cursor[0]
+        found = None, None
+        for line, entry in self._headers():
+            if line > row:
+                break
+            found = line, entry
+        return found
+
+    @staticmethod
+    def _title(entry):
+        return '[%s] %s' % ('x' if entry['apply'] else ' ', entry['path'])
+
+    @staticmethod
+    def _diff(entry):
+        lines = []
+        for leaf in entry['changes']:
+            lines.extend(leaf.get_description().rstrip('\n').split('\n'))
+        lines.append('')
+        return lines
+
+
+def _leaf_changes(changes):
+    """ Iterate over the changes of a change set (and the nested ones). """
+    if isinstance(changes, change.ChangeSet):
+        for c in changes.changes:
+            for leaf in _leaf_changes(c):
+                yield leaf
+    else:
+        yield changes
+
+
+@env.catch_exceptions
+def preview_render():
+    """ Make diffs in view of the refactoring preview buffer.
+
+    pymode: uses it on CursorMoved in the preview buffer
+
+    """
+    if RefactoringPreview.current is not None:
+        first, last = env.var_list('line("w0")', 'line("w$")')
+        RefactoringPreview.current.render(int(first), int(last))
+
+
+@env.catch_exceptions
+def preview_toggle():
+    """ Show/hide changes of the file under cursor in the preview. """
+    if RefactoringPreview.current is not None:
+        RefactoringPreview.current.toggle()
+
+
+@env.catch_exceptions
+def preview_mark():
+    """ Apply/skip the file under cursor in the preview. """
+    if RefactoringPreview.current is not None:
+        RefactoringPreview.current.mark()
+
+
+@env.catch_exceptions
+def preview_apply(apply=True):
+    """ Apply the chosen changes of the refactoring preview (or drop them).
+
+    pymode: uses it in pymode#rope#preview_close() after closing the buffer
+
+    """
+    preview, RefactoringPreview.current = RefactoringPreview.current, None
+    if preview is None or not apply:
+        return
+
+    changes = preview.selected()
+    if not changes.changes:
+        return env.message('No changes are chosen.')
+
+    changed = preview.changed(changes)
+    if changed:
+        return env.error(
+            'Files are changed after the preview, run the refactoring '
+            'again: %s' % ', '.join(changed))
+
+    with RopeContext() as ctx:
+        progress = ProgressHandler('Apply changes ...')
+        ctx.project.do(changes, task_handle=progress.handle)
+        ctx.dirty = True
+        reload_changes(changes)
+
+
 class Refactoring(object): # noqa
 
     """ Base class for refactor operations. """
@@ -477,15 +1861,11 @@ class Refactoring(object): # noqa
                     return False
 
                 if action.startswith('preview'):
-                    print("\n   ")
-                    print("-------------------------------")
-                    print("\n%s\n" % changes.get_description())
-                    print("-------------------------------\n\n")
-                    if not env.user_confirm('Do the changes?'):
-                        return False
+                    return RefactoringPreview.open(changes)
 
                 progress = ProgressHandler('Apply changes ...')
                 ctx.project.do(changes, task_handle=progress.handle)
+                ctx.dirty = True
                 reload_changes(changes)
             except exceptions.RefactoringError as e:
                 env.error(str(e))
@@ -818,25 +2198,41 @@ class GenerateElementRefactoring(Refactoring):
 
 @env.catch_exceptions
 def reload_changes(changes):
-    """ Reload changed buffers. """
+    """ Reload changed buffers.
 
+    Only files loaded in Vim are reloaded, in place: windows are not
+    switched (see pymode#rope#reload_buffers()). Modified buffers are not
+    reloaded, they are reported (saving them would undo the changes).
+
+    """
     resources = changes.get_changed_resources()
     moved = _get_moved_resources(changes) # noqa
-    current = env.curbuf.number
 
-    for f in resources:
-        bufnr = env.var('bufnr("%s")' % f.real_path)
-        env.goto_buffer(bufnr)
+    loaded = dict(
+        (os.path.realpath(path), int(bufnr)) for bufnr, path in env.var(
+            'map(filter(range(1, bufnr("$")), "bufloaded(v:val)"), '
+            '"[v:val, fnamemodify(bufname(v:val), \':p\')]")'))
 
-        path = env.curbuf.name
+    reload, rename = [], []
+    for f in resources:
+        bufnr = loaded.get(f.real_path)
+        if bufnr is None:
+            continue
         if f in moved:
-            path = moved[f].real_path
-
-        env.debug('Reload', f.real_path, path, bufnr)
-        env.goto_file(path, 'e!', force=True)
-        env.message("%s has been changed." % f.real_path, history=True)
+            rename.append([bufnr, moved[f].real_path])
+        else:
+            reload.append(bufnr)
 
-    env.goto_buffer(current)
+    env.debug('Reload', reload, rename)
+    skipped = [int(bufnr) for bufnr in env.call(
+        'pymode#rope#reload_buffers', reload, rename)]
+    env.message('%s files have been changed, %s buffers are reloaded.' % (
+        len(resources), len(reload) + len(rename) - len(skipped)),
+        history=True)
+    if skipped:
+        paths = dict((bufnr, path) for path, bufnr in loaded.items())
+        env.error('Buffers are not reloaded: %s' % ', '.join(
+            os.path.relpath(paths[bufnr]) for bufnr in skipped))
 
 
 def _get_moved_resources(changes):
@@ -854,12 +2250,17 @@ def _get_moved_resources(changes):
 
 
 def _get_autoimport_proposals(out, ctx, source, offset, dot=False):
+    """ Add autoimport names starting with the name being typed.
+
+    :return tuple: (proposals, partial): `partial` is set when some names
+        can be missed
 
+    """
     if not ctx.options.get('autoimport') or dot:
-        return out
+        return out, False
 
     if '.' in codeassist.starting_expression(source, offset):
-        return out
+        return out, False
 
     current_offset = offset - 1
     while current_offset > 0 and (
@@ -869,16 +2270,19 @@ def _get_autoimport_proposals(out, ctx, source, offset, dot=False):
     starting = starting.strip()
 
     if not starting:
-        return out
+        return out, True
 
-    for assist in ctx.importer.import_assist(starting):
+    assists = ctx.autoimport.import_assist(starting)
+    for assist in assists:
         out.append(dict(
             abbr=' : '.join(assist),
             word=assist[0],
             kind='autoimport:',
         ))
 
-    return out
+    # Names are missed while the index is loaded or when too many match
+    return out, ctx.autoimport.names is None or \
+        len(assists) >= AUTOIMPORT_LIMIT
 
 
 @env.catch_exceptions
@@ -897,7 +2301,9 @@ def complete_check():
         return False
 
     with RopeContext() as ctx:
-        modules = ctx.importer.get_modules(name)
+        if ctx.autoimport is None:
+            return False
+        modules = ctx.autoimport.get_modules(name)
 
         if not modules:
             return False
@@ -950,6 +2356,7 @@ def _insert_import(name, module, ctx):
 
     progress = ProgressHandler('Apply changes ...')
     ctx.project.do(changes, task_handle=progress.handle)
+    ctx.dirty = True
     reload_changes(changes)
 
 
@@ -983,3 +2390,25 @@ def find_source_folders(self, folder):
     return []
 
 pycore.PyCore._find_source_folders = find_source_folders  # noqa
+
+
+def write_data(self, name, data):
+    """Write project data atomically, skip it when it's not changed."""
+    if self.project.ropefolder is None:
+        return
+
+    digest = hashlib.sha1(pickle.dumps(data, 2)).hexdigest()
+    digests = self.__dict__.setdefault('_pymode_digests', dict())
+    if digests.get(name) == digest:
+        return
+
+    path = self._get_file(name).real_path
+    _write_data(self, name + '.pymode', data)
+    for suffix in ('', '.json'):
+        if os.path.exists(path + '.pymode' + suffix):
+            os.replace(path + '.pymode' + suffix, path + suffix)
+    digests[name] = digest
+
+
+_write_data = _DataFiles.write_data  # noqa
+_DataFiles.write_data = write_data  # noqa
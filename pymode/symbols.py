@@ -0,0 +1,303 @@
+"""Index of module and class level definitions of a project.
+
+The index doesn't use ``vim`` or rope: it is updated in background and saved
+with the rope project data (see ``RopeContext.update_symbols``).
+
+"""
+
+import ast
+import os
+import threading
+import tokenize
+
+
+def scan(source):
+    """Find module and class level definitions (in a source or a tree).
+
+    :return list: [(name, kind, line, parent)], `parent` is the qualified
+        name of the class (or None)
+
+    """
+    symbols = []
+
+    def _visit(body, parent):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                symbols.append((node.name, 'class', node.lineno, parent))
+                _visit(node.body, node.name if parent is None else
+                       '%s.%s' % (parent, node.name))
+
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                symbols.append((
+                    node.name, 'function' if parent is None else 'method',
+                    node.lineno, parent))
+
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [
+                    node.target]
+                for target in targets:
+                    for name in ast.walk(target):
+                        if isinstance(name, ast.Name):
+                            symbols.append((
+                                name.id, 'variable' if parent is None else
+                                'attribute', node.lineno, parent))
+
+            # Conditional definitions
+            elif isinstance(node, (ast.If, ast.Try)):
+                _visit(node.body, parent)
+                _visit(node.orelse, parent)
+                for handler in getattr(node, 'handlers', []):
+                    _visit(handler.body, parent)
+                _visit(getattr(node, 'finalbody', []), parent)
+
+    tree = source if isinstance(source, ast.AST) else ast.parse(source)
+    _visit(tree.body, None)
+    return symbols
+
+
+# Nodes with scopes of their own
+SCOPES = (
+    ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef,
+    ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+# Match patterns binding names (python 3.10+)
+PATTERNS = tuple(
+    getattr(ast, name) for name in ('MatchAs', 'MatchStar', 'MatchMapping')
+    if hasattr(ast, name))
+
+
+def is_local(tree, name, row, col):
+    """Check the name at the position isn't a module level name.
+
+    The name is local when it's bound in a function, lambda or comprehension
+    around the position (or in a class when the position is in its body) or
+    when it's a keyword argument. `col` is the byte offset of the name.
+
+    :return bool:
+
+    """
+    scopes = [
+        node for node in ast.walk(tree) if isinstance(node, SCOPES) and
+        node.lineno <= row <= node.end_lineno]
+
+    # ast.walk goes breadth first: the innermost scope is the last one
+    for num, scope in enumerate(scopes):
+        if isinstance(scope, ast.ClassDef) and num < len(scopes) - 1:
+            continue
+        if name in _bound(scope):
+            return True
+
+    return any(
+        isinstance(node, ast.keyword) and node.arg == name and
+        getattr(node, 'lineno', None) == row and node.col_offset == col
+        for node in ast.walk(tree))
+
+
+def _bound(scope):
+    """Find names bound in the scope (not in the scopes nested into it).
+
+    :return set:
+
+    """
+    names, declared = set(), set()
+    nodes = list(ast.iter_child_nodes(scope))
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, SCOPES):
+            if hasattr(node, 'name'):
+                names.add(node.name)
+            continue
+
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update(
+                alias.asname or alias.name.split('.')[0]
+                for alias in node.names)
+        elif isinstance(node, ast.Global):
+            declared.update(node.names)
+        elif isinstance(node, ast.Nonlocal):
+            names.update(node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, PATTERNS):
+            names.add(getattr(node, 'name', None) or getattr(
+                node, 'rest', None))
+        nodes.extend(ast.iter_child_nodes(node))
+
+    return names - declared
+
+
+def stamp(path):
+    """Get a stamp to find out a file is changed.
+
+    :return tuple|None:
+
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def match(query, name):
+    """Match a name with a query (case insensitive).
+
+    :return tuple|None: A rank (less is better): exact names go first, then
+        names starting with the query, containing it and containing its
+        letters in order (with less letters between them).
+
+    """
+    query, name = query.lower(), name.lower()
+    if name == query:
+        return 0, 0
+    if name.startswith(query):
+        return 1, len(name)
+    if query in name:
+        return 2, name.index(query)
+
+    pos = gaps = 0
+    for char in query:
+        found = name.find(char, pos)
+        if found < 0:
+            return None
+        gaps += found - pos
+        pos = found + 1
+    return 3, gaps
+
+
+class SymbolIndex(object):
+
+    """Definitions of the project files."""
+
+    def __init__(self, files=None):
+        """Init the index with saved data.
+
+        :param files: {path: (stamp, symbols)}
+
+        """
+        self.files = dict()
+        self.names = dict()
+        self.lock = threading.Lock()
+        for path, (st, symbols) in (files or dict()).items():
+            self._set(path, st, symbols)
+
+    def update(self, path):
+        """Scan the file when it's changed.
+
+        :return bool: The index is changed
+
+        """
+        st = stamp(path)
+        if st is None:
+            return self.remove(path)
+
+        old = self.files.get(path)
+        if old is not None and old[0] == st:
+            return False
+
+        try:
+            with tokenize.open(path) as f:
+                symbols = scan(f.read())
+        except (SyntaxError, ValueError, UnicodeDecodeError, OSError):
+            # Keep the definitions until the file is fixed
+            if old is not None:
+                return False
+            symbols = []
+
+        with self.lock:
+            self._set(path, st, symbols)
+        return True
+
+    def update_all(self, paths, handle=None):
+        """Scan changed files, forget the files which are not listed.
+
+        :return bool: The index is changed
+
+        """
+        changed = False
+        for path in paths:
+            if handle is not None and handle.is_stopped():
+                return changed
+            changed = self.update(path) or changed
+
+        paths = set(paths)
+        for path in [p for p in self.files if p not in paths]:
+            changed = self.remove(path) or changed
+        return changed
+
+    def remove(self, path):
+        """Forget definitions of the file.
+
+        :return bool: The index is changed
+
+        """
+        with self.lock:
+            if path not in self.files:
+                return False
+            self._set(path, None, None)
+        return True
+
+    def lookup(self, name):
+        """Find definitions with the name.
+
+        :return list: [(path, line, kind, parent)]
+
+        """
+        with self.lock:
+            return [
+                (path, line, kind, parent)
+                for path in sorted(self.names.get(name, ()))
+                for n, kind, line, parent in self.files[path][1] if n == name]
+
+    def search(self, query, limit=100):
+        """Find definitions matching the query (fuzzy).
+
+        A query with dots is matched with qualified names (Class.method).
+
+        :return list: [(path, line, kind, qualified name)]
+
+        """
+        with self.lock:
+            files = list(self.files.items())
+
+        found = []
+        for path, (_, symbols) in files:
+            for name, kind, line, parent in symbols:
+                qualified = name if parent is None else '%s.%s' % (
+                    parent, name)
+                rank = match(query, qualified if '.' in query else name)
+                if rank is not None:
+                    found.append((rank, len(qualified), qualified, path, line,
+                                  kind))
+
+        found.sort()
+        return [
+            (path, line, kind, qualified)
+            for _, _, qualified, path, line, kind in found[:limit]]
+
+    def data(self):
+        """Get the data to save.
+
+        :return dict:
+
+        """
+        with self.lock:
+            return dict(self.files)
+
+    def _set(self, path, st, symbols):
+        old = self.files.pop(path, None)
+        for name, _, _, _ in old[1] if old else ():
+            paths = self.names.get(name)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self.names[name]
+
+        if symbols is not None:
+            self.files[path] = st, symbols
+            for name, _, _, _ in symbols:
+                self.names.setdefault(name, set()).add(path)
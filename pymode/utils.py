@@ -1,8 +1,10 @@
 """Pymode utils."""
+import itertools
 import os.path
 import sys
 import threading
 import warnings
+from collections import OrderedDict
 from contextlib import contextmanager
 from io import StringIO
 
@@ -46,3 +48,169 @@ def patch_paths():
             module_full_path = os.path.join(dir_submodule, module)
             if module_full_path not in sys.path:
                 sys.path.insert(0, module_full_path)
+
+
+class FileCache(object):
+
+    """Contents of recently read files (checked by modification time).
+
+    Thread safe: files are read by worker pools.
+
+    """
+
+    def __init__(self, max_size=32 * 1024 * 1024):
+        """Init the cache.
+
+        :param max_size: Max total size of cached files (bytes)
+
+        """
+        self.max_size = max_size
+        self.size = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        """Read the file.
+
+        :return bytes|None: None when the file can't be read
+
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = stat.st_mtime_ns, stat.st_size
+
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == stamp:
+                self._files.move_to_end(path)
+                return cached[1]
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        with self._lock:
+            old = self._files.pop(path, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._files[path] = stamp, data, None
+            self.size += len(data)
+            while self.size > self.max_size and len(self._files) > 1:
+                _, (_, old, _) = self._files.popitem(last=False)
+                self.size -= len(old)
+        return data
+
+    def lines(self, path):
+        """Get lines of the file (decoded as UTF-8).
+
+        :return list:
+
+        """
+        data = self.read(path)
+        if data is None:
+            return []
+
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[1] is data and \
+                    cached[2] is not None:
+                return cached[2]
+
+        lines = data.decode('utf-8', 'replace').splitlines()
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[1] is data:
+                self._files[path] = cached[0], data, lines
+        return lines
+
+
+FILES = FileCache()
+
+
+class Task(object):
+
+    """A function call to run in background.
+
+    Tasks must not use ``vim``: the result is taken by the main thread (e.g.
+    from a timer) when `done` is set.
+
+    """
+
+    ids = itertools.count(1)
+
+    def __init__(self, kind, func, *args, **kwargs):
+        """Init the task."""
+        self.id = next(self.ids)
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.context = dict()
+        self.cancelled = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        """Skip the task (if it is not started yet)."""
+        self.cancelled = True
+
+    def run(self):
+        """Call the function."""
+        if not self.cancelled:
+            try:
+                self.result = self.func(*self.args, **self.kwargs)
+            except Exception as e:  # noqa
+                self.error = e
+        self.done.set()
+
+
+class Worker(object):
+
+    """Run tasks one by one in a background thread.
+
+    Only the latest task of a kind is waiting: a new task cancels the older
+    one.
+
+    """
+
+    def __init__(self):
+        """Init the worker."""
+        self._tasks = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, task):
+        """Add the task to the queue.
+
+        :return Task:
+
+        """
+        with self._cond:
+            old = self._tasks.pop(task.kind, None)
+            if old is not None:
+                old.cancel()
+                old.done.set()
+            self._tasks[task.kind] = task
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+        return task
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._cond.wait()
+                _, task = self._tasks.popitem(last=False)
+            task.run()
+
+
+WORKER = Worker()
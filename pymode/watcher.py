@@ -0,0 +1,284 @@
+"""Watch a project tree for changed files.
+
+Watchers run in a background thread and never use ``vim``. Rope asks them
+for the paths changed since the last time (see ``RopeContext.validate``).
+
+"""
+
+import abc
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+
+def ignored(name):
+    """Check a file or a folder should not be watched.
+
+    :return bool:
+
+    """
+    return name.startswith('.') or name == '__pycache__'
+
+
+class Watcher(metaclass=abc.ABCMeta):
+
+    """Collect paths changed in a tree.
+
+    Subclasses watch the tree in :meth:`_run`.
+
+    """
+
+    def __init__(self, root):
+        """Init the watcher."""
+        self.root = root
+        self._lock = threading.Lock()
+        self._paths = set()
+        # Everything should be checked until the watcher is ready
+        self._full = True
+        self._ready = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._start, daemon=True)
+
+    def start(self):
+        """Start watching in background.
+
+        :return Watcher:
+
+        """
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching."""
+        self._stopped.set()
+
+    def changes(self):
+        """Get paths changed since the last call.
+
+        :return tuple: (paths, full) -- everything should be checked when
+            `full` is set (the watcher is not ready or lost events)
+
+        """
+        with self._lock:
+            paths, full = self._paths, self._full
+            self._paths = set()
+            self._full = not self.ready
+        return paths, full
+
+    @property
+    def ready(self):
+        """Check the watcher catches changes."""
+        return self._ready and self._thread.is_alive() and \
+            not self._stopped.is_set()
+
+    def _changed(self, path=None):
+        with self._lock:
+            if path is None:
+                self._full = True
+            else:
+                self._paths.add(path)
+
+    def _set_ready(self):
+        # Changes made before the watcher has been ready are lost
+        with self._lock:
+            self._full = self._ready = True
+
+    def _folders(self, root=None):
+        for folder, dirs, _ in os.walk(root or self.root):
+            dirs[:] = [name for name in dirs if not ignored(name)]
+            yield folder
+
+    def _start(self):
+        try:
+            self._run()
+        finally:
+            self._changed()
+
+    @abc.abstractmethod
+    def _run(self):
+        """Watch the tree until the watcher is stopped."""
+
+
+class PollingWatcher(Watcher):
+
+    """Watch the tree comparing modification times periodically.
+
+    The interval is doubled (up to `max_interval`) while nothing changes and
+    nobody asks for changes, so idle projects are scanned rarely.
+
+    """
+
+    def __init__(self, root, interval=2.0, max_interval=30.0):
+        """Init the watcher."""
+        super(PollingWatcher, self).__init__(root)
+        self.interval = interval
+        self.max_interval = max_interval
+        self._asked = False
+
+    def changes(self):
+        """Get paths changed since the last call.
+
+        :return tuple: (paths, full)
+
+        """
+        self._asked = True
+        return super(PollingWatcher, self).changes()
+
+    def _scan(self):
+        mtimes = dict()
+        for folder in self._folders():
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                if ignored(entry.name):
+                    continue
+                try:
+                    # Added and removed children are found by paths
+                    mtimes[entry.path] = None if entry.is_dir() else \
+                        entry.stat(follow_symlinks=False).st_mtime_ns
+                except OSError:
+                    pass
+        return mtimes
+
+    def _run(self):
+        old = self._scan()
+        self._set_ready()
+        interval = self.interval
+        while not self._stopped.wait(interval):
+            new = self._scan()
+            changed = set(old) ^ set(new)
+            changed.update(
+                path for path, mtime in new.items()
+                if path in old and old[path] != mtime)
+            for path in changed:
+                self._changed(path)
+            old = new
+
+            if changed or self._asked:
+                interval = self.interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+            self._asked = False
+
+
+class InotifyWatcher(PollingWatcher):
+
+    """Watch the tree with Linux inotify.
+
+    Falls back to polling when there are too many folders to watch.
+
+    """
+
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+
+    MASK = (
+        IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+        IN_DELETE | IN_DELETE_SELF)
+
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, root):
+        """Init inotify.
+
+        :raises OSError: When inotify is not available
+
+        """
+        super(InotifyWatcher, self).__init__(root)
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is not available')
+
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._folders_by_wd = dict()
+
+    def _watch(self, folder):
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+        self._folders_by_wd[wd] = folder
+
+    def _run(self):
+        try:
+            try:
+                for folder in self._folders():
+                    self._watch(folder)
+            except OSError:
+                os.close(self._fd)
+                self._fd = None
+                return super(InotifyWatcher, self)._run()
+
+            self._set_ready()
+            while not self._stopped.is_set():
+                if select.select([self._fd], [], [], 1.0)[0]:
+                    self._read(os.read(self._fd, 64 * 1024))
+
+        finally:
+            if self._fd is not None:
+                os.close(self._fd)
+
+    def _read(self, data):
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, size = self.EVENT.unpack_from(data, pos)
+            pos += self.EVENT.size
+            name = os.fsdecode(data[pos:pos + size].rstrip(b'\0'))
+            pos += size
+
+            if mask & self.IN_Q_OVERFLOW:
+                self._changed()
+                continue
+
+            folder = self._folders_by_wd.get(wd)
+            if mask & self.IN_IGNORED:
+                self._folders_by_wd.pop(wd, None)
+            if folder is None:
+                continue
+
+            if not name:
+                if mask & self.IN_DELETE_SELF:
+                    self._changed(folder)
+                continue
+
+            if ignored(name):
+                continue
+
+            path = os.path.join(folder, name)
+            self._changed(path)
+            if mask & self.IN_ISDIR and mask & (
+                    self.IN_CREATE | self.IN_MOVED_TO):
+                try:
+                    for sub in self._folders(path):
+                        self._watch(sub)
+                except OSError:
+                    self._changed()
+
+
+def watch(root):
+    """Start watching the tree: with inotify when it's available.
+
+    :return Watcher:
+
+    """
+    try:
+        return InotifyWatcher(root).start()
+    except (OSError, AttributeError):
+        return PollingWatcher(root).start()
@@ -19,8 +19,12 @@ source ./test_helpers_bash/test_createvimrc.sh
 declare -a TEST_ARRAY=(
     "./test_bash/test_autopep8.sh"
     "./test_bash/test_autocommands.sh"
+    "./test_bash/test_completion.sh"
     "./test_bash/test_folding.sh"
+    "./test_bash/test_indent.sh"
+    "./test_bash/test_lintproject.sh"
     "./test_bash/test_textobject.sh"
+    "./test_bash/test_transfer.sh"
     )
 MAIN_RETURN=0
 ## now loop through the above array
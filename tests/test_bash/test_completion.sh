@@ -0,0 +1,18 @@
+#! /bin/bash
+
+# Source file.
+set +e
+# shellcheck source=../test_helpers_bash/test_prepare_between_tests.sh
+source ./test_helpers_bash/test_prepare_between_tests.sh
+CONTENT="$(vim --clean -i NONE -u "${VIM_TEST_VIMRC}" \
+    --cmd "let g:pymode_rope = 1" \
+    --cmd "let g:pymode_rope_project_root = '$(dirname "${VIM_DISPOSABLE_PYFILE}")'" \
+    --cmd "let g:pymode_rope_watch = 0" \
+    --cmd "let g:pymode_rope_symbols = 0" \
+    -c "source ./test_procedures_vimscript/completion.vim" "${VIM_DISPOSABLE_PYFILE}" 2>&1)"
+RETURN_CODE=$?
+echo -e "${CONTENT}" >> "${VIM_OUTPUT_FILE}"
+set -e
+
+exit ${RETURN_CODE}
+# vim: set fileformat=unix filetype=sh wrap tw=0 :
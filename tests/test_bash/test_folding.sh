@@ -7,6 +7,7 @@ declare -a TEST_PYMODE_FOLDING_TESTS_ARRAY=(
     "./test_procedures_vimscript/folding2.vim"
     # "./test_procedures_vimscript/folding3.vim"
     "./test_procedures_vimscript/folding4.vim"
+    "./test_procedures_vimscript/folding5.vim"
     )
 
 RETURN_CODE=0
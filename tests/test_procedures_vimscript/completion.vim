@@ -0,0 +1,33 @@
+" Docs of the selected completion item are shown in the info popup.
+if !exists('##CompleteChanged') || !exists('*popup_findinfo')
+    quit!
+endif
+
+set completeopt=menuone,popup
+
+call setline(1, [
+\    'def func1():',
+\    '    """Docs of func1."""',
+\    '',
+\    '',
+\    'func'])
+
+let g:popup_text = []
+fun! PopupText()
+    let id = popup_findinfo()
+    if id && popup_getpos(id).visible
+        let g:popup_text = getbufline(winbufnr(id), 1, '$')
+    endif
+    return ''
+endfun
+
+call feedkeys("GA\<C-R>=pymode#rope#complete(0)\<CR>\<C-R>=PopupText()\<CR>\<Esc>", 'xt')
+
+" Assert the popup shows docs of the proposal.
+call assert_equal(['Docs of func1.'], g:popup_text)
+
+if len(v:errors) > 0
+    cquit!
+else
+    quit!
+endif
@@ -0,0 +1,43 @@
+" Test that docstring states and fold levels updated after changes are the
+" same as computed for the whole buffer.
+
+" For safety empty current buffer.
+execute "normal! :%d\<CR>"
+
+" Load sample python file.
+read ./test_python_sample_code/folding2.py
+execute "normal! gg"
+execute "normal! dd"
+
+set fdm=marker
+set fdm=expr
+
+function! s:Check()
+    let docstrings = copy(pymode#docstring#states())
+    let foldlevels = map(range(1, line('$')), 'pymode#folding#expr(v:val)')
+    unlet b:pymode_docstrings b:pymode_folding
+    call assert_equal(pymode#docstring#states(), docstrings)
+    call assert_equal(
+        \ map(range(1, line('$')), 'pymode#folding#expr(v:val)'), foldlevels)
+endfunction
+
+call s:Check()
+
+" Open a docstring in the middle of the file.
+execute "normal! 20GO\"\"\"Start."
+call s:Check()
+
+" Close it again.
+execute "normal! 30Go\"\"\""
+call s:Check()
+
+" Remove a definition.
+execute "normal! 24Gdd"
+call s:Check()
+
+" Assert changes.
+if len(v:errors) > 0
+    cquit!
+else
+    quit!
+endif
@@ -0,0 +1,89 @@
+" Test indentation of lines in brackets (brackets in strings and comments are
+" skipped) and that the brackets kept after changes are the same as found for
+" the whole buffer.
+
+" For safety empty current buffer.
+execute "normal! :%d\<CR>"
+
+setlocal indentexpr=pymode#indent#get_indent(v:lnum) shiftwidth=4 expandtab
+
+let s:expected = [
+    \ 'def func(arg1,',
+    \ '         arg2="(",  # [',
+    \ '         arg3=[1,',
+    \ '               2]):',
+    \ '    text = """',
+    \ '    (',
+    \ '    """',
+    \ '    return {',
+    \ '        "key": (arg1,',
+    \ '                arg2),',
+    \ '    }',
+    \ ]
+call setline(1, map(copy(s:expected), 'substitute(v:val, "^\\s*", "", "")'))
+execute "normal! gg=G"
+call assert_equal(s:expected, getline(1, '$'))
+
+function! s:Check()
+    let indents = map(range(1, line('$')), 'pymode#indent#get_indent(v:val)')
+    unlet! b:pymode_brackets
+    call assert_equal(
+        \ map(range(1, line('$')), 'pymode#indent#get_indent(v:val)'), indents)
+endfunction
+
+" Open a bracket.
+execute "normal! 3GA("
+call s:Check()
+
+" Close it again.
+execute "normal! 5GO)"
+call s:Check()
+
+" Remove lines.
+execute "normal! 1G2dd"
+call s:Check()
+
+" An unterminated string stops python tokenizer on python 3.12+: the lines
+" after it are indented by searching for the brackets.
+execute "normal! :%d\<CR>"
+unlet! b:pymode_brackets
+let s:expected = [
+    \ 'items = [first,',
+    \ "         'second,",
+    \ '         third]',
+    \ 'call(one,',
+    \ '     two)',
+    \ ]
+call setline(1, map(copy(s:expected), 'substitute(v:val, "^\\s*", "", "")'))
+execute "normal! gg=G"
+call assert_equal(s:expected, getline(1, '$'))
+call s:Check()
+
+" Reindent a range: every line set by = keeps the brackets of the buffer, so
+" the lines are not scanned again.
+execute "normal! :%d\<CR>"
+unlet! b:pymode_brackets
+let s:expected = [
+    \ 'result = call(first,',
+    \ '              second,',
+    \ '              third)',
+    \ 'value = [1,',
+    \ '         2]',
+    \ 'end = 0',
+    \ ]
+call setline(1, s:expected)
+call pymode#indent#get_indent(line('$'))
+let s:scanned = get(get(b:, 'pymode_brackets', {}), 'scanned', 0)
+execute "normal! 2G>>3G<<5G>>"
+execute "normal! 2G=3j"
+call assert_equal(s:expected, getline(1, '$'))
+call pymode#indent#get_indent(2)
+call assert_equal(s:scanned, get(get(b:, 'pymode_brackets', {}), 'scanned', 0))
+call s:Check()
+
+" Assert changes.
+if len(v:errors) > 0
+    cquit!
+else
+    quit!
+endif
@@ -0,0 +1,70 @@
+" Test PymodeLintProject: python files of the project are checked into the
+" quickfix list, files ignored by .gitignore are skipped and changed files
+" are checked again. The same with the background worker (JSON requests and
+" responses line by line), which also drops results of outdated requests.
+
+let s:root = tempname() . '_project'
+call mkdir(s:root . '/build', 'p')
+call mkdir(s:root . '/sub', 'p')
+call writefile(['build/'], s:root . '/.gitignore')
+call writefile(['import os'], s:root . '/bad.py')
+call writefile(['print(1)'], s:root . '/main.py')
+call writefile(['import re'], s:root . '/sub/more.py')
+call writefile(['import sys'], s:root . '/build/ignored.py')
+execute 'cd ' . fnameescape(s:root)
+execute 'edit ' . fnameescape(s:root . '/main.py')
+
+let g:pymode_lint_checkers = ['pyflakes']
+let g:pymode_lint_async = 0
+
+" Get the quickfix issues as 'path:line'.
+function! s:Issues()
+    return sort(map(
+        \ filter(getqflist(), 'v:val.text =~# "imported but unused"'),
+        \ 'fnamemodify(bufname(v:val.bufnr), ":.") . ":" . v:val.lnum'))
+endfunction
+
+" Wait for an expression to be true while background results are received.
+function! s:Wait(expr)
+    for _ in range(100)
+        if eval(a:expr)
+            return 1
+        endif
+        sleep 100m
+    endfor
+    return 0
+endfunction
+
+PymodeLintProject
+call assert_equal(['bad.py:1', 'sub/more.py:1'], s:Issues())
+
+" Errors of a changed file are not taken from the project index.
+call writefile(['import os', 'os.getcwd()'], s:root . '/bad.py')
+PymodeLintProject
+call assert_equal(['sub/more.py:1'], s:Issues())
+
+if g:PymodeJob.supported()
+    let g:pymode_lint_async = 1
+    call writefile(['import os'], s:root . '/bad.py')
+
+    " The response to an outdated buffer request is dropped: the project
+    " results come after it.
+    call setline(1, 'import json')
+    PymodeLint
+    let b:pymode_lint_request += 1
+    PymodeLintProject
+    call assert_true(s:Wait("s:Issues() == ['bad.py:1', 'sub/more.py:1']"))
+    call assert_equal([], getloclist(0))
+
+    " The response to the last request is shown.
+    PymodeLint
+    call assert_true(s:Wait('len(getloclist(0)) == 1'))
+    call pymode#lint#stop()
+endif
+
+" Assert changes.
+if len(v:errors) > 0
+    cquit!
+else
+    quitall!
+endif
@@ -76,6 +76,133 @@ call assert_true(content == [
 \    ""
 \])
 
+
+" Clean file.
+%delete
+
+" A count selects following classes of the same parent only.
+call setline(1, [
+\    'class A:',
+\    '    class Inner:',
+\    '        x = 1',
+\    '',
+\    'class B:',
+\    '    y = 2',
+\    '',
+\    'class C:',
+\    '    z = 3'])
+normal 3Gd2aC
+
+let content=getline('^', '$')
+call assert_true(content == [
+\    'class A:',
+\    '',
+\    'class B:',
+\    '    y = 2',
+\    '',
+\    'class C:',
+\    '    z = 3'])
+
+%delete
+call setline(1, [
+\    'class A:',
+\    '    x = 1',
+\    '',
+\    'class B:',
+\    '    y = 2',
+\    '',
+\    'class C:',
+\    '    z = 3'])
+normal 2Gd2aC
+
+let content=getline('^', '$')
+call assert_true(content == [
+\    '',
+\    'class C:',
+\    '    z = 3'])
+
+
+" Clean file.
+%delete
+
+" Decorators are a part of a method.
+call setline(1, [
+\    'class A:',
+\    '    @property',
+\    '    def x(self):',
+\    '        return 1',
+\    '',
+\    '    def y(self):',
+\    '        return 2'])
+normal 4GdaM
+
+let content=getline('^', '$')
+call assert_true(content == [
+\    'class A:',
+\    '',
+\    '    def y(self):',
+\    '        return 2'])
+
+%delete
+call setline(1, [
+\    'class A:',
+\    '    @property',
+\    '    def x(self):',
+\    '        return 1',
+\    '',
+\    '    def y(self):',
+\    '        return 2',
+\    '',
+\    'def z():',
+\    '    return 3'])
+normal 2Gd3aM
+
+let content=getline('^', '$')
+call assert_true(content == [
+\    'class A:',
+\    '',
+\    'def z():',
+\    '    return 3'])
+
+
+" Clean file.
+%delete
+
+" The inner selection starts after a multi-line signature.
+call setline(1, [
+\    'def func(',
+\    '        a,',
+\    '        b):',
+\    '    c = a + b',
+\    '    return c'])
+normal 2GdiM
+
+let content=getline('^', '$')
+call assert_true(content == [
+\    'def func(',
+\    '        a,',
+\    '        b):'])
+
+
+" Clean file.
+%delete
+
+" A count over the methods stops at the last method.
+call setline(1, [
+\    'class A:',
+\    '    def x(self):',
+\    '        return 1',
+\    '',
+\    '    def y(self):',
+\    '        return 2',
+\    '',
+\    'def z():',
+\    '    return 3'])
+normal 2G5]M
+
+call assert_true(line('.') == 5)
+
+
 if len(v:errors) > 0
     cquit!
 else
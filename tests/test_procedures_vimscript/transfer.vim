@@ -0,0 +1,46 @@
+" Test passing python values to Vim and measure it (micro-benchmark).
+"
+" Passes 1000 error entries (as code checking does) as a JSON literal, the
+" old way, and with env.let(). Timings are printed to the output file.
+
+python3 << EOF
+import json
+import timeit
+
+import vim
+from pymode.environment import env
+
+errors = [dict(
+    lnum=n, col=1, type='W', text="'os' imported but unused",
+    source='pyflakes', number='W0611', bufnr=1) for n in range(1000)]
+
+
+def _json():
+    vim.command('let g:pymode_test_json = %s' % json.dumps(errors))
+
+
+def _native():
+    env.let('g:pymode_test_native', errors)
+
+
+for name, func in (('json', _json), ('native', _native)):
+    elapsed = min(timeit.repeat(func, number=10, repeat=5)) / 10
+    print('transfer (%s): %.2f ms per 1k errors' % (name, elapsed * 1000))
+
+env.let_all({'g:pymode_test_a': [1, 'b'], 'g:pymode_test_b': {'c': 'd'}})
+env.let('g:pymode_test_keys', {1: 'a'})
+EOF
+
+" Assert changes.
+call assert_equal(g:pymode_test_json, g:pymode_test_native)
+call assert_equal(1000, len(g:pymode_test_native))
+call assert_equal([1, 'b'], g:pymode_test_a)
+call assert_equal({'c': 'd'}, g:pymode_test_b)
+call assert_equal({'1': 'a'}, g:pymode_test_keys)
+call assert_false(exists('g:pymode_transfer'))
+
+if len(v:errors) > 0
+    cquit!
+else
+    quit!
+endif